@@ -0,0 +1,54 @@
+"""
+Benchmark holding and looking up many contracts.
+
+Compares the ibapi based Contract, which is not hashable and needs
+a contractKey for lookups, with the CompactContract.
+"""
+import sys
+import time
+import tracemalloc
+
+from tws_async import Option, CompactContract, contractKey
+
+
+def makeOptions(n):
+    # distinct options with different expirations, strikes and rights
+    return [Option('SPY', '2017{:02d}{:02d}'.format(i % 12 + 1, i % 28 + 1),
+            100 + i // 168, 'CP'[i // 84 % 2]) for i in range(n)]
+
+
+def bench(name, func):
+    t0 = time.perf_counter()
+    func()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{:>32}: {:>8.1f} ms, {:>8.1f} MB'.format(
+            name, 1000 * dt, size / 1e6))
+    return result
+
+
+def main():
+    n = 50000
+    print('{} contracts:'.format(n))
+    contracts = bench('create Option', lambda: makeOptions(n))
+    compacts = bench('create CompactContract', lambda: [
+            CompactContract.fromContract(c) for c in contracts])
+
+    byKey = bench('dict keyed by contractKey', lambda: {
+            contractKey(c): i for i, c in enumerate(contracts)})
+    byCompact = bench('dict keyed by CompactContract', lambda: {
+            c: i for i, c in enumerate(compacts)})
+
+    bench('lookup by contractKey', lambda: [
+            byKey[contractKey(c)] for c in contracts])
+    bench('lookup by CompactContract', lambda: [
+            byCompact[c] for c in compacts])
+    bench('intern', lambda: [CompactContract.intern(c) for c in compacts])
+    bench('toContract', lambda: [c.toContract() for c in compacts])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
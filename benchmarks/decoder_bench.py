@@ -0,0 +1,114 @@
+"""
+Benchmark the FastDecoder against the ibapi decoder on a stream of
+market data messages.
+
+Before timing, the wrapper calls made by both decoders are recorded and
+compared, so that the benchmark doubles as a parity check.
+"""
+import sys
+import time
+import random
+
+import ibapi.decoder
+import ibapi.server_versions
+from ibapi.wrapper import EWrapper
+
+from tws_async.fastdecoder import FastDecoder
+
+
+class Recorder(EWrapper):
+    """
+    Wrapper that records the calls made to it.
+    """
+    def __init__(self):
+        EWrapper.__init__(self)
+        self.calls = []
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        self.calls.append(('tickPrice', reqId, tickType, price,
+                sorted(vars(attrib).items())))
+
+    def tickSize(self, reqId, tickType, size):
+        self.calls.append(('tickSize', reqId, tickType, size))
+
+    def tickString(self, reqId, tickType, value):
+        self.calls.append(('tickString', reqId, tickType, value))
+
+    def tickGeneric(self, reqId, tickType, value):
+        self.calls.append(('tickGeneric', reqId, tickType, value))
+
+    def nextValidId(self, orderId):
+        self.calls.append(('nextValidId', orderId))
+
+
+class Counter(EWrapper):
+    """
+    Wrapper that does as little as possible.
+    """
+    def tickPrice(self, reqId, tickType, price, attrib):
+        pass
+
+    def tickSize(self, reqId, tickType, size):
+        pass
+
+    def tickString(self, reqId, tickType, value):
+        pass
+
+    def tickGeneric(self, reqId, tickType, value):
+        pass
+
+
+def makeMessages(num):
+    rnd = random.Random(0)
+    msgs = []
+    for _ in range(num):
+        reqId = b'%d' % rnd.randint(1, 500)
+        kind = rnd.random()
+        if kind < 0.5:
+            msgs.append([b'1', b'6', reqId, b'%d' % rnd.choice([1, 2, 4, 6, 9]),
+                    b'%.2f' % rnd.uniform(1, 1000), b'%d' % rnd.randint(0, 999),
+                    b'%d' % rnd.randint(0, 7)])
+        elif kind < 0.8:
+            msgs.append([b'2', b'6', reqId, b'%d' % rnd.choice([0, 3, 5, 8]),
+                    b'%d' % rnd.randint(0, 99999)])
+        elif kind < 0.9:
+            msgs.append([b'46', b'6', reqId, b'45', b'%d' % rnd.randint(
+                    1500000000, 1600000000)])
+        elif kind < 0.99:
+            msgs.append([b'45', b'6', reqId, b'49', b'%.1f' % rnd.random()])
+        else:
+            msgs.append([b'9', b'1', b'%d' % rnd.randint(1, 1000)])
+    return msgs
+
+
+def decoders(wrapperClass):
+    serverVersion = ibapi.server_versions.MAX_CLIENT_VER
+    return [(cls.__name__, cls(wrapperClass(), serverVersion))
+            for cls in (ibapi.decoder.Decoder, FastDecoder)]
+
+
+def main():
+    msgs = makeMessages(200000)
+
+    results = []
+    for _, decoder in decoders(Recorder):
+        for fields in msgs:
+            decoder.interpret(fields)
+        results.append(decoder.wrapper.calls)
+    if results[0] != results[1]:
+        print('Parity check FAILED')
+        return 1
+    print('Parity check passed: {} identical wrapper calls'.format(
+            len(results[0])))
+
+    for name, decoder in decoders(Counter):
+        interpret = decoder.interpret
+        t0 = time.perf_counter()
+        for fields in msgs:
+            interpret(fields)
+        dt = time.perf_counter() - t0
+        print('{:>11}: {:>10,.0f} msgs/s'.format(name, len(msgs) / dt))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
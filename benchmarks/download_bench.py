@@ -0,0 +1,57 @@
+"""
+Benchmark HistRequester.download against the mock server.
+
+Five days of 1-minute bars are downloaded for a number of stocks, one
+file per day, in CSV and in the binary bar format. Reported are the
+stage times of the download stats and the lag of the event loop.
+
+Usage: python download_bench.py [numStocks]
+"""
+import sys
+import shutil
+import tempfile
+import datetime
+
+from tws_async import HistRequester, HistRequest, Stock
+
+from mockserver_bench import freePort, startServer
+
+
+def bench(port, numStocks, fileFormat):
+    tws = HistRequester()
+    tws.maxMsgsPerSec = 0
+    tws.connect('127.0.0.1', port, clientId=1)
+    metrics = tws.enableMetrics(0.005)
+    end = datetime.date(2017, 1, 6)
+    reqs = [HistRequest(Stock('SYM{}'.format(i)), end, '5 D')
+            for i in range(numStocks)]
+    rootDir = tempfile.mkdtemp()
+    try:
+        stats = tws.run(tws.download(reqs, rootDir, fileFormat=fileFormat))
+    finally:
+        shutil.rmtree(rootDir)
+    lag = metrics.snapshot()['loopLagUs']
+    tws.disconnect()
+    print('{:>5}: {} requests, {:,} bars in {} files, {:.2f} s; '
+            'network {:.2f} s, decode {:.2f} s, write {:.2f} s, '
+            'write wait {:.2f} s; loop lag p99 {:.1f} ms, max {:.1f} ms'.
+            format(fileFormat, stats['requests'], stats['bars'],
+            stats['files'], stats['seconds'], stats['networkSeconds'],
+            stats['decodeSeconds'], stats['writeSeconds'],
+            stats['writeWaitSeconds'], lag['p99'] / 1000,
+            lag['max'] / 1000))
+
+
+def main():
+    numStocks = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    port = freePort()
+    proc = startServer(port, 0)
+    try:
+        for fileFormat in ('csv', 'bars'):
+            bench(port, numStocks, fileFormat)
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
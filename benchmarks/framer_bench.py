@@ -0,0 +1,72 @@
+"""
+Benchmark the framing of bursts of small messages, as received at the
+market open or after a reconnect.
+
+Compares the Framer with the previous approach of re-slicing a bytes
+object for every message.
+"""
+import sys
+import struct
+import time
+
+from tws_async.framer import Framer
+
+
+def makeBurst(numMsgs):
+    msg = b'1\x006\x00123\x001\x00101.25\x00300\x001\x00'
+    frame = struct.pack('>I', len(msg)) + msg
+    return frame * numMsgs
+
+
+def sliceFrames(data):
+    # the framing as done originally in TWSClient._onSocketHasData
+    msgs = []
+    while True:
+        if len(data) <= 4:
+            break
+        msgEnd = 4 + struct.unpack('>I', data[:4])[0]
+        if len(data) < msgEnd:
+            break
+        msgs.append(data[4:msgEnd])
+        data = data[msgEnd:]
+    return msgs
+
+
+def framerFrames(data, framer=Framer()):
+    framer.feed(data)
+    return framer.frames()
+
+
+def bench(name, func, burst, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        numFrames = len(func(burst))
+    dt = time.perf_counter() - t0
+    print('{:>8}: {:>10,.0f} frames/s'.format(
+            name, numFrames * repeat / dt))
+
+
+def main():
+    for numMsgs in (100, 1000, 10000, 50000):
+        burst = makeBurst(numMsgs)
+        repeat = max(1, 200000 // numMsgs)
+        print('Burst of {} messages ({} bytes):'.format(numMsgs, len(burst)))
+        bench('slicing', sliceFrames, burst, repeat)
+        bench('Framer', framerFrames, burst, repeat)
+
+    # many reads that each end with a partial message
+    burst = makeBurst(20000)
+    chunks = [burst[i:i + 1400] for i in range(0, len(burst), 1400)]
+    framer = Framer()
+    t0 = time.perf_counter()
+    numFrames = 0
+    for chunk in chunks:
+        framer.feed(chunk)
+        numFrames += len(framer.frames())
+    dt = time.perf_counter() - t0
+    print('Chunked reads of 1400 bytes: {:,.0f} frames/s'.format(
+            numFrames / dt))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
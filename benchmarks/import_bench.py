@@ -0,0 +1,47 @@
+"""
+Benchmark the time it takes to import the package in a fresh interpreter.
+
+The plain import should only load asyncio and ibapi; the Qt client and
+the historical data modules (with numpy) are loaded on first use.
+"""
+import sys
+import subprocess
+
+statements = [
+    ('import tws_async', 'import tws_async'),
+    ('TWSClient', 'from tws_async import TWSClient'),
+    ('HistRequester', 'from tws_async import HistRequester'),
+    ('TWSClientQt', 'from tws_async import TWSClientQt'),
+]
+
+heavyModules = ['PyQt5', 'numpy', 'tws_async.twsclientqt',
+        'tws_async.histrequester', 'tws_async.barstore']
+
+
+def timeImport(stmt, repeat):
+    code = ('import sys, time; t0 = time.perf_counter(); {}; '
+            'dt = time.perf_counter() - t0; '
+            'print(dt, *[m for m in {!r} if m in sys.modules])'.format(
+            stmt, heavyModules))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code])
+        dt, *loaded = out.decode().split()
+        times.append(float(dt))
+    return min(times), loaded
+
+
+def main():
+    repeat = 5
+    for name, stmt in statements:
+        try:
+            dt, loaded = timeImport(stmt, repeat)
+        except subprocess.CalledProcessError:
+            print('{:>16}: failed'.format(name))
+            continue
+        print('{:>16}: {:>7.1f} ms, loaded: {}'.format(
+                name, 1000 * dt, ', '.join(loaded) or '-'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark the latency of the asyncio transport against a local echo
+stand-in for the server.
+
+The echo server runs in a subprocess and sends every received byte back.
+Timestamped messages are sent one at a time to measure the round trip,
+and in bursts to measure the throughput of the read path.
+Compared are the default transport and the low-latency mode, and both
+again with uvloop if it is installed.
+
+Usage: python latency_bench.py [numPings]
+"""
+import sys
+import time
+import socket
+import struct
+import asyncio
+import subprocess
+
+from tws_async import util
+from tws_async.framer import Framer
+from tws_async.twsclient import TWSConnection
+
+
+class Echo(asyncio.Protocol):
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+
+def runServer(port):
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(loop.create_server(Echo, '127.0.0.1', port))
+    loop.run_forever()
+
+
+def startServer():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, __file__, '--server', str(port)])
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Echo server did not start')
+
+
+class EchoClient:
+    """
+    Sends timestamped messages and collects their round trip times.
+    """
+    def __init__(self, port, lowLatency):
+        self.framer = Framer()
+        self.conn = TWSConnection('127.0.0.1', port, 0, lowLatency,
+                0, self.framer)
+        self.conn.connected = lambda: None
+        self.conn.connectionLost = lambda: None
+        self.conn.hasData = self.onData
+        self.numExpected = 0
+        self.done = None
+        self.rtts = []
+
+    def onData(self, data):
+        if data is not None:
+            self.framer.feed(data)
+        now = time.perf_counter()
+        for msg in self.framer.frames():
+            self.rtts.append(now - float(msg[:-1]))
+        if len(self.rtts) >= self.numExpected:
+            self.done.set_result(None)
+
+    async def send(self, numMsgs, padding=b''):
+        self.numExpected = len(self.rtts) + numMsgs
+        self.done = asyncio.Future()
+        for _ in range(numMsgs):
+            msg = repr(time.perf_counter()).encode() + padding + b'\0'
+            self.conn.sendMsg(struct.pack('>I', len(msg)) + msg)
+        await self.done
+
+
+async def bench(port, lowLatency, numPings):
+    client = EchoClient(port, lowLatency)
+    await client.conn.connect()
+    for _ in range(numPings):
+        await client.send(1)
+    rtts = sorted(client.rtts)
+    client.rtts = []
+    numBurst = 100000
+    t0 = time.perf_counter()
+    for _ in range(10):
+        await client.send(numBurst // 10, b' ' * 40)
+    dt = time.perf_counter() - t0
+    client.conn.disconnect()
+    return (1e6 * rtts[len(rtts) // 2], 1e6 * rtts[int(len(rtts) * 0.99)],
+            numBurst / dt)
+
+
+def main():
+    if sys.argv[1:2] == ['--server']:
+        return runServer(int(sys.argv[2]))
+    numPings = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    proc, port = startServer()
+    try:
+        for loopName in ('asyncio', 'uvloop'):
+            if loopName == 'uvloop' and not util.useUvloop():
+                break
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            for lowLatency in (False, True):
+                p50, p99, rate = loop.run_until_complete(
+                        bench(port, lowLatency, numPings))
+                print('{:>8} {:>12}: round trip p50 {:.0f} us, p99 {:.0f} us,'
+                        ' burst {:,.0f} msgs/s'.format(loopName,
+                        'low-latency' if lowLatency else 'default',
+                        p50, p99, rate))
+            loop.close()
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
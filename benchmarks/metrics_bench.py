@@ -0,0 +1,75 @@
+"""
+Benchmark the cost of the metrics on the message handling of the client.
+
+A stream of market data messages is fed to the client in 64 kB reads,
+without a connection, once with and once without metrics enabled.
+"""
+import sys
+import time
+import struct
+import asyncio
+import pprint
+
+import ibapi.decoder
+import ibapi.server_versions
+
+from tws_async import TWSClient
+
+from decoder_bench import makeMessages
+
+
+class Client(TWSClient):
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        pass
+
+    def tickSize(self, reqId, tickType, size):
+        pass
+
+    def tickString(self, reqId, tickType, value):
+        pass
+
+    def tickGeneric(self, reqId, tickType, value):
+        pass
+
+    def nextValidId(self, orderId):
+        pass
+
+
+def makeStream(msgs):
+    chunks = []
+    for fields in msgs:
+        msg = b'\0'.join(fields) + b'\0'
+        chunks.append(struct.pack('>I', len(msg)) + msg)
+    return b''.join(chunks)
+
+
+def bench(stream, numMsgs, metrics):
+    client = Client()
+    client.serverVersion_ = ibapi.server_versions.MAX_CLIENT_VER
+    client.decoder = ibapi.decoder.Decoder(client, client.serverVersion_)
+    if metrics:
+        client.enableMetrics(0)
+    t0 = time.perf_counter()
+    for i in range(0, len(stream), 65536):
+        client._onSocketHasData(stream[i:i + 65536])
+    dt = time.perf_counter() - t0
+    print('{:>16}: {:>10,.0f} msgs/s'.format(
+            'metrics' if metrics else 'no metrics', numMsgs / dt))
+    return client.metrics
+
+
+def main():
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    msgs = makeMessages(200000)
+    stream = makeStream(msgs)
+    bench(stream, len(msgs), False)
+    metrics = bench(stream, len(msgs), True)
+    snapshot = metrics.snapshot()
+    for name in ('messages', 'framesPerRead', 'bytesBuffered'):
+        print(name + ':')
+        pprint.pprint(snapshot[name])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+End-to-end benchmark of the clients against the mock server.
+
+The mock server runs in a subprocess and streams ticks at the given rate.
+Reported are the received messages per second, the latency of the
+timestamped ticks and the throughput of historical data requests.
+
+Usage: python mockserver_bench.py [tickRate] [seconds] [--qt]
+"""
+import sys
+import time
+import socket
+import asyncio
+import datetime
+import subprocess
+
+from tws_async import TWSClient, HistRequester, HistRequest, Stock
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def startServer(port, tickRate):
+    proc = subprocess.Popen([sys.executable, '-m', 'tws_async.mockserver',
+            str(port), str(tickRate)], stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Mock server did not start')
+
+
+class TickCounter:
+    """
+    Mixin that counts ticks and measures the latency of timestamped ticks.
+    """
+    def initCounter(self):
+        # the mock server has no limit on incoming messages
+        self.maxMsgsPerSec = 0
+        self.numTicks = 0
+        self.latencies = []
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        self.numTicks += 1
+
+    def tickSize(self, reqId, tickType, size):
+        self.numTicks += 1
+
+    def tickString(self, reqId, tickType, value):
+        self.numTicks += 1
+        if tickType == 45:
+            self.latencies.append(time.time() - float(value))
+
+    def subscribe(self, numContracts):
+        for i in range(numContracts):
+            self.reqMktData(self.getReqId(), Stock('SYM{}'.format(i)),
+                    '', False, False, [])
+
+    def report(self, name, seconds):
+        lat = sorted(self.latencies) or [float('nan')]
+        print('{:>12}: {:>10,.0f} ticks/s, latency p50 {:.3f} ms, '
+                'p99 {:.3f} ms'.format(name, self.numTicks / seconds,
+                1000 * lat[len(lat) // 2], 1000 * lat[int(len(lat) * 0.99)]))
+
+
+class AsyncioCounter(TickCounter, TWSClient):
+    def __init__(self):
+        TWSClient.__init__(self)
+        self.initCounter()
+
+
+def benchAsyncio(port, seconds, fastDecoder):
+    tws = AsyncioCounter()
+    tws.fastDecoder = fastDecoder
+    tws.connect('127.0.0.1', port, clientId=1)
+    tws.subscribe(100)
+    tws.run(asyncio.sleep(1))
+    tws.initCounter()
+    tws.run(asyncio.sleep(seconds))
+    tws.disconnect()
+    name = 'FastDecoder' if fastDecoder else 'TWSClient'
+    tws.report(name, seconds)
+
+
+def benchQt(port, seconds):
+    import PyQt5.Qt as qt
+    from tws_async import TWSClientQt
+
+    class QtCounter(TickCounter, TWSClientQt):
+        def __init__(self):
+            TWSClientQt.__init__(self)
+            self.initCounter()
+
+    tws = QtCounter()
+    tws.connect('127.0.0.1', port, clientId=2)
+    tws.subscribe(100)
+    qt.QTimer.singleShot(1000, tws.initCounter)
+    qt.QTimer.singleShot(int(1000 * (1 + seconds)), tws.qApp.quit)
+    tws.run()
+    tws.report('TWSClientQt', seconds)
+
+
+def benchHist(port):
+    tws = HistRequester()
+    tws.maxMsgsPerSec = 0
+    tws.connect('127.0.0.1', port, clientId=3)
+    end = datetime.datetime(2017, 1, 2)
+    reqs = [HistRequest(Stock('SYM{}'.format(i)),
+            end + datetime.timedelta(days=i)) for i in range(50)]
+    t0 = time.perf_counter()
+    results = tws.run(asyncio.gather(*[tws.histReqAsync(req)
+            for req in reqs]))
+    dt = time.perf_counter() - t0
+    tws.disconnect()
+    numBars = sum(len(r) for r in results)
+    print('{:>12}: {} requests, {:,.0f} bars/s, {:.1f} ms per request'.
+            format('HistRequester', len(reqs), numBars / dt,
+            1000 * dt / len(reqs)))
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    tickRate = int(args[0]) if args else 50000
+    seconds = float(args[1]) if len(args) > 1 else 5
+    port = freePort()
+    proc = startServer(port, tickRate)
+    try:
+        print('Streaming at {:,} msgs/s for {} s'.format(tickRate, seconds))
+        benchAsyncio(port, seconds, False)
+        benchAsyncio(port, seconds, True)
+        if '--qt' in sys.argv:
+            benchQt(port, seconds)
+        benchHist(port)
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Record a session with the mock server to a capture file and replay it
+into different clients as fast as possible.
+
+Usage: python replay_bench.py [capturePath] [tickRate] [seconds]
+
+If the capture file exists it is replayed without recording.
+"""
+import os
+import sys
+import asyncio
+import datetime
+
+from tws_async import TWSClient, HistRequest, Stock, Recorder, Replayer
+from tws_async import HistRequester
+
+from mockserver_bench import freePort, startServer
+
+
+class Client(HistRequester):
+    """
+    Client with tickers for the streamed contracts.
+    """
+    def __init__(self):
+        HistRequester.__init__(self)
+        self.maxMsgsPerSec = 0
+        self.numUpdates = 0
+
+    def tickersUpdated(self, tickers):
+        self.numUpdates += len(tickers)
+
+
+def record(path, tickRate, seconds, lowLatency):
+    port = freePort()
+    proc = startServer(port, tickRate)
+    try:
+        tws = Client()
+        tws.lowLatency = lowLatency
+        recorder = Recorder(tws, path)
+        recorder.start()
+        tws.connect('127.0.0.1', port, clientId=1)
+        for i in range(100):
+            tws.reqTicker(Stock('SYM{}'.format(i)))
+        end = datetime.datetime(2017, 1, 2)
+        tws.run(asyncio.gather(*[tws.histReqAsync(HistRequest(
+                Stock('SYM{}'.format(i)), end)) for i in range(10)]))
+        tws.run(asyncio.sleep(seconds))
+        recorder.stop()
+        tws.disconnect()
+    finally:
+        proc.terminate()
+    print('Recorded {:,} bytes to {}'.format(recorder.numBytes, path))
+
+
+def replay(replayer, name, client):
+    stats = replayer.replay(client)
+    print('{:>12}: {:,} messages in {:.3f} s, {:>10,.0f} msgs/s'.format(
+            name, stats['messages'], stats['seconds'], stats['msgsPerSec']))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'session.cap'
+    tickRate = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 3
+    if not os.path.exists(path):
+        record(path, tickRate, seconds, False)
+    replayer = Replayer(path)
+
+    replay(replayer, 'TWSClient', TWSClient())
+    client = TWSClient()
+    client.fastDecoder = True
+    replay(replayer, 'FastDecoder', client)
+    client = Client()
+    replay(replayer, 'Client', client)
+    client = TWSClient()
+    client.enableMetrics(0)
+    replay(replayer, 'Metrics', client)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark the resampling of bars.
+
+Batch resampling of a million 1-minute bars is timed for the NumPy
+columns, the plain array columns and the incremental Resampler, which
+must all give the same bars. Then a HistRequester downloads 1-minute bars
+for a number of stocks from the mock server, followed by four coarser
+bar sizes of the same days, with and without resampleLocally. Reported
+are the server requests that were sent and the elapsed time.
+
+Usage: python resample_bench.py [numStocks]
+"""
+import sys
+import time
+import random
+import asyncio
+import datetime
+
+from tws_async import HistRequester, HistRequest, Stock
+from tws_async import BarStore, Resampler, resample
+
+from mockserver_bench import freePort, startServer
+
+
+def makeBars(numBars, useNumpy):
+    store = BarStore(useNumpy=useNumpy)
+    rnd = random.Random(0)
+    t = 1483228800
+    price = 100.0
+    for _ in range(numBars):
+        # skip some minutes without trades
+        t += 60 * (1 + (rnd.random() < 0.1))
+        o = price
+        price = c = round(o + rnd.gauss(0, 0.1), 2)
+        store.append(t, o, max(o, c) + 0.01, min(o, c) - 0.01, c,
+                rnd.randint(0, 1000))
+    return store
+
+
+def rows(store):
+    return [[store.column(name)[i] for name in BarStore.names]
+            for i in range(len(store))]
+
+
+def benchBatch(numBars):
+    results = []
+    for name, useNumpy in (('numpy', True), ('array', False)):
+        store = makeBars(numBars, useNumpy)
+        t0 = time.perf_counter()
+        data = resample(store, '5 mins')
+        dt = time.perf_counter() - t0
+        results.append(data)
+        print('{:>12}: {:,.0f} bars/s'.format(name, numBars / dt))
+    t0 = time.perf_counter()
+    resampler = Resampler('5 mins')
+    resampler.extend(store)
+    dt = time.perf_counter() - t0
+    results.append(resampler.data)
+    print('{:>12}: {:,.0f} bars/s'.format('Resampler', numBars / dt))
+    expected = rows(results[0])
+    assert all(rows(r) == expected for r in results[1:]), 'mismatch'
+    print('{:>12}: {:,} bars resampled the same'.format('parity',
+            len(expected)))
+
+
+class CountingRequester(HistRequester):
+
+    def __init__(self):
+        HistRequester.__init__(self)
+        self.numRequests = 0
+
+    async def histReqAsync(self, req, timeout=None):
+        self.numRequests += 1
+        return await HistRequester.histReqAsync(self, req, timeout)
+
+
+def benchHist(port, numStocks, resampleLocally):
+    tws = CountingRequester()
+    tws.maxMsgsPerSec = 0
+    tws.resampleLocally = resampleLocally
+    tws.connect('127.0.0.1', port, clientId=1)
+    end = datetime.datetime(2017, 1, 3)
+    contracts = [Stock('SYM{}'.format(i)) for i in range(numStocks)]
+    t0 = time.perf_counter()
+    tws.run(asyncio.gather(*[tws.barsAsync(HistRequest(c, end))
+            for c in contracts]))
+    results = tws.run(asyncio.gather(*[
+            tws.barsAsync(HistRequest(c, end, barSizeSetting=barSize))
+            for c in contracts
+            for barSize in ('5 mins', '15 mins', '30 mins', '1 hour')]))
+    dt = time.perf_counter() - t0
+    tws.disconnect()
+    assert [len(r) for r in results[:4]] == [288, 96, 48, 24]
+    print('{:>12}: {} server requests for {} requests, {:.2f} s'.format(
+            'local' if resampleLocally else 'server', tws.numRequests,
+            5 * numStocks, dt))
+
+
+def main():
+    numStocks = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print('Resampling 1,000,000 1-minute bars to 5 minutes')
+    benchBatch(1000000)
+    port = freePort()
+    proc = startServer(port, 0)
+    try:
+        print('Downloading 5 bar sizes of one day for {} stocks'.format(
+                numStocks))
+        benchHist(port, numStocks, False)
+        benchHist(port, numStocks, True)
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark the recording of ticks on the message handling of the client.
+
+A stream of market data messages is fed to the client in 4 kB reads,
+without a connection: without recording, with a synchronous file write
+per tick in the tick callbacks and with the TickRecorder (with fsync after
+every batch). Reported are the messages per second and the handling time
+per read. The recorded chunks are then read back with loadTicks.
+
+Usage: python tickrecorder_bench.py [directory]
+"""
+import os
+import sys
+import time
+import struct
+import shutil
+import asyncio
+import tempfile
+
+import ibapi.decoder
+import ibapi.server_versions
+
+from tws_async import TWSClient, loadTicks, tickChunks
+
+from decoder_bench import makeMessages
+from metrics_bench import makeStream
+
+_record = struct.Struct('<diHd')
+
+
+class SyncClient(TWSClient):
+    """
+    Client that writes every tick to a file from the tick callbacks.
+    """
+    def openFile(self, path):
+        self.file = open(path, 'wb', buffering=0)
+
+    def _writeTick(self, reqId, tickType, value):
+        self.file.write(_record.pack(time.time(), reqId, tickType, value))
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        self._writeTick(reqId, tickType, price)
+
+    def tickSize(self, reqId, tickType, size):
+        self._writeTick(reqId, tickType, size)
+
+    def tickGeneric(self, reqId, tickType, value):
+        self._writeTick(reqId, tickType, value)
+
+
+def bench(name, client, stream, numMsgs):
+    client.serverVersion_ = ibapi.server_versions.MAX_CLIENT_VER
+    client.decoder = ibapi.decoder.Decoder(client, client.serverVersion_)
+    times = []
+    t0 = time.perf_counter()
+    for i in range(0, len(stream), 4096):
+        t1 = time.perf_counter()
+        client._onSocketHasData(stream[i:i + 4096])
+        times.append(time.perf_counter() - t1)
+    dt = time.perf_counter() - t0
+    times.sort()
+    print('{:>12}: {:>10,.0f} msgs/s, per read median {:.2f} ms, '
+            'p99 {:.2f} ms, max {:.2f} ms'.format(name, numMsgs / dt,
+            1000 * times[len(times) // 2], 1000 * times[len(times) * 99 //
+            100], 1000 * times[-1]))
+
+
+def main():
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    msgs = makeMessages(200000)
+    stream = makeStream(msgs)
+    try:
+        bench('none', TWSClient(), stream, len(msgs))
+
+        client = SyncClient()
+        client.openFile(os.path.join(directory, 'sync.bin'))
+        bench('sync write', client, stream, len(msgs))
+        client.file.close()
+
+        client = TWSClient()
+        recorder = client.startTickRecorder(directory, fsync='batch',
+                chunkSize=1024 * 1024)
+        bench('recorder', client, stream, len(msgs))
+        t0 = time.perf_counter()
+        client.stopTickRecorder()
+        print('{:>12}: {:.1f} ms to write the rest, {:,} ticks in {} '
+                'batches, {} dropped'.format('stop',
+                1000 * (time.perf_counter() - t0), recorder.numTicks,
+                recorder.numBatches, recorder.numDropped))
+
+        t0 = time.perf_counter()
+        numTicks = 0
+        paths = tickChunks(directory)
+        for path in paths:
+            ticks, _ = loadTicks(path)
+            numTicks += len(ticks)
+        dt = time.perf_counter() - t0
+        assert numTicks == recorder.numTicks
+        print('{:>12}: {:,} ticks from {} chunks, {:,.0f} ticks/s'.format(
+                'loadTicks', numTicks, len(paths), numTicks / dt))
+    finally:
+        if len(sys.argv) <= 1:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark tick streams with a slow consumer against the mock server.
+
+For each overflow policy a consumer that takes a millisecond per
+tick reads one tick stream while the server streams at the given rate.
+Reported are the consumed and dropped ticks, the number of pauses of
+the socket and the largest backlog of the stream.
+
+Usage: python tickstream_bench.py [tickRate] [seconds]
+"""
+import sys
+import time
+
+from tws_async import TWSClient, Stock, DROP_OLDEST, CONFLATE, BLOCK
+
+from mockserver_bench import freePort, startServer
+
+
+async def consume(stream, seconds):
+    numTicks = 0
+    maxLen = 0
+    end = time.time() + seconds
+    async for _ in stream:
+        numTicks += 1
+        maxLen = max(maxLen, len(stream) + 1)
+        time.sleep(0.001)
+        if time.time() > end:
+            break
+    return numTicks, maxLen
+
+
+def bench(port, policy, seconds):
+    tws = TWSClient()
+    tws.maxMsgsPerSec = 0
+    tws.connect('127.0.0.1', port, clientId=1)
+    stream = tws.reqTickStream(Stock('SYM0'), capacity=1024, policy=policy)
+    numTicks, maxLen = tws.run(consume(stream, seconds))
+    tws.cancelTickStream(stream)
+    tws.disconnect()
+    print('{:>12}: consumed {:>6,}, dropped {:>8,}, paused {:>4}, '
+            'max backlog {:>6,}'.format(policy, numTicks, stream.numDropped,
+            stream.numPaused, maxLen))
+
+
+def main():
+    tickRate = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    port = freePort()
+    proc = startServer(port, tickRate)
+    try:
+        print('Streaming at {:,} msgs/s for {} s, consuming 1000 ticks/s'.
+                format(tickRate, seconds))
+        for policy in (DROP_OLDEST, CONFLATE, BLOCK):
+            bench(port, policy, seconds)
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
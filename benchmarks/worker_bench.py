@@ -0,0 +1,58 @@
+"""
+Benchmark the responsiveness of the event loop while streaming ticks
+from the mock server, with decoding on the loop and in a decode worker.
+
+A probe sleeps 1 ms at a time on the loop; the overshoot of each sleep
+is the lag that other tasks on the loop would see.
+
+Usage: python worker_bench.py [tickRate] [seconds]
+"""
+import sys
+import time
+import asyncio
+
+from mockserver_bench import freePort, startServer, AsyncioCounter
+
+
+async def probe(lags, seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - t0 - 0.001)
+
+
+def bench(name, port, seconds, fastDecoder, decodeWorker):
+    tws = AsyncioCounter()
+    tws.fastDecoder = fastDecoder
+    tws.decodeWorker = decodeWorker
+    tws.connect('127.0.0.1', port, clientId=1)
+    tws.subscribe(100)
+    tws.run(asyncio.sleep(1))
+    tws.initCounter()
+    lags = []
+    tws.run(probe(lags, seconds))
+    tws.disconnect()
+    lags.sort()
+    print('{:>12}: {:>10,.0f} ticks/s, loop lag p50 {:.3f} ms, '
+            'p99 {:.3f} ms, max {:.3f} ms'.format(name,
+            tws.numTicks / seconds, 1000 * lags[len(lags) // 2],
+            1000 * lags[int(len(lags) * 0.99)], 1000 * lags[-1]))
+
+
+def main():
+    tickRate = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    port = freePort()
+    proc = startServer(port, tickRate)
+    try:
+        print('Streaming at {:,} msgs/s for {} s'.format(tickRate, seconds))
+        bench('TWSClient', port, seconds, False, False)
+        bench('FastDecoder', port, seconds, True, False)
+        bench('DecodeWorker', port, seconds, False, True)
+    finally:
+        proc.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
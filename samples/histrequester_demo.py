@@ -16,13 +16,13 @@ forexs = [
 ]
 
 endDate = datetime.date.today()
-startDate = endDate - datetime.timedelta(days=7)
 
-histReqs = []
-for date in util.dateRange(startDate, endDate):
-    histReqs += [HistRequest(stock, date) for stock in stocks]
-    histReqs += [HistRequest(forex, date, whatToShow='MIDPOINT',
-            durationStr='30 D', barSizeSetting='1 day') for forex in forexs]
+# requests longer than the server allows for the bar size
+# are split into chunks, with a file per chunk
+histReqs = [HistRequest(stock, endDate, durationStr='7 D')
+        for stock in stocks]
+histReqs += [HistRequest(forex, endDate, whatToShow='MIDPOINT',
+        durationStr='30 D', barSizeSetting='1 day') for forex in forexs]
 
 timezone = datetime.timezone.utc
 # timezone = pytz.timezone('Europe/Amsterdam')
@@ -32,4 +32,5 @@ util.logToConsole()
 tws = HistRequester()
 tws.connect('127.0.0.1', 7497, clientId=1)
 task = tws.download(histReqs, rootDir='data', timezone=timezone)
-tws.run(task)
+stats = tws.run(task)
+print(stats)
@@ -12,7 +12,7 @@ with open(os.path.join(here, 'README.rst'), encoding='utf-8') as f:
 
 setup(
     name='tws_async',
-    version='0.5.7',
+    version='0.6.0',
     description=('Use the Interactive Brokers API (IBAPI) asynchonously'
             'with asyncio or PyQt5'),
     long_description=long_description,
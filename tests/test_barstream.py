@@ -0,0 +1,67 @@
+"""
+BarStream updates when the request is sent again after a reconnect.
+"""
+import asyncio
+
+from tws_async import HistRequest, Stock
+from tws_async.histrequester import BarStream
+
+
+class Requester:
+    """
+    Stand-in for a HistRequester, that counts the sent requests.
+    """
+    def __init__(self):
+        self.numRequests = 0
+
+    def _sendHistRequest(self, reqId, req, end):
+        self.numRequests += 1
+
+
+def bar(i, close=100.0):
+    return (1500000000 + 60 * i, 100.0, 101.0, 99.0, close, 10 * i)
+
+
+def updates(stream):
+    bars = []
+    while not stream._updates.empty():
+        bars.append(stream._updates.get_nowait())
+    return bars
+
+
+def test_replayed_bars_are_not_updates():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        checkReplay()
+    finally:
+        loop.close()
+
+
+def checkReplay():
+    requester = Requester()
+    stream = BarStream(HistRequest(Stock('AAPL')))
+    stream._send(requester, 1)
+    for i in range(60):
+        stream.addBar(*bar(i))
+    stream._backfilled.set_result(None)
+    stream.addBar(*bar(59, 100.5))
+    assert len(updates(stream)) == 1
+
+    # reconnect: the whole duration is sent again, including the bars
+    # that were missed while disconnected
+    stream._send(requester, 2)
+    for i in range(70):
+        stream.addBar(*bar(i, 100.5 if i == 59 else 100.0))
+    bars = updates(stream)
+    assert requester.numRequests == 2
+    # the last bar from before the reconnect and the missed bars
+    assert len(bars) == 11
+    assert bars[0][4] == 100.5
+    assert len(stream.data) == 70
+
+    # a replayed bar that changed is an update
+    stream._send(requester, 3)
+    stream.addBar(*bar(30, 98.0))
+    stream.addBar(*bar(31))
+    assert [b[4] for b in updates(stream)] == [98.0]
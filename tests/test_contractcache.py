@@ -0,0 +1,58 @@
+"""
+ContractCache qualification of ibapi and compact contracts.
+"""
+import asyncio
+
+from tws_async import Stock
+from tws_async.contracts import CompactContract
+from tws_async.contractcache import ContractCache
+
+
+class Details:
+
+    def __init__(self, contract):
+        self.contract = contract
+
+
+class Client:
+    """
+    Stand-in for a client, that knows one contract.
+    """
+    def __init__(self):
+        self.numRequests = 0
+
+    async def contractDetailsAsync(self, contract, timeout=None):
+        self.numRequests += 1
+        return [Details(Stock('AAPL', 'NASDAQ', exchange='NASDAQ',
+                conId=265598, localSymbol='AAPL', tradingClass='NMS'))]
+
+
+def qualify(cache, *contracts):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(cache.qualifyAsync(*contracts))
+    finally:
+        loop.close()
+
+
+def test_qualify_in_place():
+    cache = ContractCache(Client(), path=None)
+    contract = Stock('AAPL')
+    assert qualify(cache, contract) == [contract]
+    assert contract.conId == 265598
+    assert contract.exchange == 'SMART'
+
+
+def test_qualify_compact():
+    client = Client()
+    cache = ContractCache(client, path=None)
+    contract = CompactContract(secType='STK', symbol='AAPL',
+            exchange='SMART', currency='USD')
+    for _ in range(2):
+        qualified, = qualify(cache, contract)
+        assert isinstance(qualified, CompactContract)
+        assert qualified.conId == 265598
+        assert qualified.localSymbol == 'AAPL'
+        assert qualified.exchange == 'SMART'
+    assert contract.conId == 0
+    assert client.numRequests == 1
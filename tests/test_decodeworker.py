@@ -0,0 +1,35 @@
+"""
+EventRing records that are larger than the ring.
+"""
+import sys
+import threading
+
+import pytest
+
+from tws_async.decodeworker import EventRing, RAW, TICK_SIZE, CLOSED
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32',
+        reason='the decode worker is POSIX only')
+
+
+def test_large_records():
+    ring = EventRing(1024)
+    payloads = [b'x' * 5000, bytes(range(256)) * 9, b'', b'y' * 512]
+
+    def write():
+        for payload in payloads:
+            ring.put(RAW, payload)
+            ring.putStruct(TICK_SIZE, 1, 0, len(payload))
+        ring.put(CLOSED)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    records = []
+    while not records or records[-1][0] != CLOSED:
+        records += ring.drain(3)
+    thread.join()
+    ring.close()
+    expected = []
+    for payload in payloads:
+        expected += [(RAW, payload), (TICK_SIZE, (1, 0, len(payload)))]
+    assert records == expected + [(CLOSED, b'')]
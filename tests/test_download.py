@@ -0,0 +1,74 @@
+"""
+Downloads with HistRequester, from the mock server or without one.
+"""
+import os
+import csv
+import asyncio
+import datetime
+
+from tws_async import HistRequester, HistRequest, Stock
+from tws_async.manifest import Manifest
+from tws_async.mockserver import MockServer
+
+
+def test_legacy_files_are_registered(tmpdir):
+    # day files from before the manifest existed
+    rootDir = str(tmpdir)
+    dates = [datetime.date(2017, 11, d) for d in (13, 14, 15)]
+    for date in dates:
+        path = os.path.join(rootDir,
+                'AAPL_1min_{}.csv'.format(date.strftime('%Y%m%d')))
+        with open(path, 'w') as f:
+            f.write('Date,Open,High,Low,Close,Volume\n')
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        tws = HistRequester()
+        reqs = [HistRequest(Stock('AAPL'), date) for date in dates]
+        # a request to the server would wait for a connection
+        stats = loop.run_until_complete(asyncio.wait_for(
+                tws.download(reqs, rootDir), 5))
+        # again, now with the manifest
+        stats2 = loop.run_until_complete(asyncio.wait_for(
+                tws.download(reqs, rootDir), 5))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+    assert stats['requests'] == stats2['requests'] == 0
+    assert stats['files'] == stats2['files'] == 0
+    assert sorted(os.listdir(rootDir)) == ['AAPL_1min_20171113.csv',
+            'AAPL_1min_20171114.csv', 'AAPL_1min_20171115.csv',
+            'manifest.json']
+    ranges = Manifest(rootDir).ranges('AAPL_1min_TRADES')
+    assert [r[2] for r in ranges] == sorted(os.listdir(rootDir))[:3]
+
+
+def test_partial_gap_is_trimmed(tmpdir):
+    # B overlaps the stored A for half a day, which is the only gap
+    rootDir = str(tmpdir)
+    reqA = HistRequest(Stock('AAPL'), datetime.datetime(2020, 1, 9, 12),
+            '1 D', '1 hour')
+    reqB = HistRequest(Stock('AAPL'), datetime.datetime(2020, 1, 11),
+            '2 D', '1 hour')
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = MockServer(port=0, tickRate=10)
+    try:
+        loop.run_until_complete(server.start())
+        tws = HistRequester()
+        tws.connect('127.0.0.1', server.port, clientId=1)
+        loop.run_until_complete(tws.download([reqA], rootDir))
+        stats = loop.run_until_complete(tws.download([reqB], rootDir))
+        tws.disconnect()
+    finally:
+        server.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+    assert stats['requests'] == 1
+    ranges = Manifest(rootDir).ranges('AAPL_1hour_TRADES')
+    (startA, endA, fileA), (startB, endB, fileB) = ranges
+    assert endA == startB
+    with open(os.path.join(rootDir, fileB)) as f:
+        rows = list(csv.reader(f))[1:]
+    assert len(rows) == (endB - startB) // 3600
+    assert rows[0][0] == '2020-01-09 12:00:00'
@@ -0,0 +1,101 @@
+"""
+Parity of the FastDecoder with the ibapi decoder: both must make the same
+wrapper calls, or fail in the same way, for the same messages.
+"""
+import pytest
+
+import ibapi.decoder
+import ibapi.server_versions as sv
+from ibapi.wrapper import EWrapper
+
+from tws_async.fastdecoder import FastDecoder
+
+serverVersions = sorted({
+    sv.MIN_CLIENT_VER,
+    sv.MIN_SERVER_VER_PAST_LIMIT - 1,
+    sv.MIN_SERVER_VER_PAST_LIMIT,
+    sv.MIN_SERVER_VER_PRE_OPEN_BID_ASK - 1,
+    sv.MIN_SERVER_VER_PRE_OPEN_BID_ASK,
+    sv.MIN_SERVER_VER_ENCODE_MSG_ASCII7 - 1,
+    sv.MIN_SERVER_VER_ENCODE_MSG_ASCII7,
+    sv.MAX_CLIENT_VER})
+
+messages = {
+    'tickPrice': [b'1', b'6', b'5', b'1', b'101.25', b'300', b'0'],
+    'tickPriceAttribs': [b'1', b'6', b'5', b'2', b'101.5', b'100', b'7'],
+    'tickPriceAutoExecute': [b'1', b'6', b'5', b'4', b'99.0', b'1', b'1'],
+    'tickPriceNoSize': [b'1', b'6', b'5', b'9', b'98.75', b'0', b'0'],
+    'tickPriceEmpty': [b'1', b'6', b'', b'', b'', b'', b''],
+    'tickPriceShort': [b'1', b'6', b'5', b'1'],
+    'tickPriceLong': [b'1', b'6', b'5', b'1', b'1.5', b'2', b'0', b'extra'],
+    'tickSize': [b'2', b'6', b'5', b'0', b'1200'],
+    'tickSizeEmpty': [b'2', b'6', b'5', b'8', b''],
+    'tickSizeShort': [b'2', b'6', b'5'],
+    'tickSizeLong': [b'2', b'6', b'5', b'0', b'1', b'2'],
+    'tickGeneric': [b'45', b'6', b'5', b'49', b'0.5'],
+    'tickGenericEmpty': [b'45', b'6', b'5', b'49', b''],
+    'tickString': [b'46', b'6', b'5', b'45', b'1500000000'],
+    'tickStringEmpty': [b'46', b'6', b'5', b'32', b''],
+    'tickStringUtf8': [b'46', b'6', b'5', b'32', 'café ü'.encode()],
+    'tickStringEscaped': [b'46', b'6', b'5', b'32', b'caf\\u00e9'],
+    'tickStringLatin1': [b'46', b'6', b'5', b'32', b'\xff\xfe'],
+    'tickStringShort': [b'46', b'6', b'5', b'32'],
+    'tickStringLong': [b'46', b'6', b'5', b'32', b'a', b'b'],
+}
+
+
+class Recorder(EWrapper):
+    """
+    Wrapper that records the calls made to it.
+    """
+    def __init__(self):
+        EWrapper.__init__(self)
+        self.calls = []
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        self.calls.append(('tickPrice', reqId, tickType, price,
+                sorted(vars(attrib).items())))
+
+    def tickSize(self, reqId, tickType, size):
+        self.calls.append(('tickSize', reqId, tickType, size))
+
+    def tickString(self, reqId, tickType, value):
+        self.calls.append(('tickString', reqId, tickType, value))
+
+    def tickGeneric(self, reqId, tickType, value):
+        self.calls.append(('tickGeneric', reqId, tickType, value))
+
+
+def decode(decoderClass, serverVersion, fields):
+    decoder = decoderClass(Recorder(), serverVersion)
+    try:
+        decoder.interpret(list(fields))
+        error = None
+    except Exception as e:
+        error = type(e)
+    return decoder.wrapper.calls, error
+
+
+@pytest.mark.parametrize('serverVersion', serverVersions)
+@pytest.mark.parametrize('name', sorted(messages))
+def test_parity(serverVersion, name):
+    fields = messages[name]
+    expected = decode(ibapi.decoder.Decoder, serverVersion, fields)
+    assert decode(FastDecoder, serverVersion, fields) == expected
+
+
+@pytest.mark.parametrize('serverVersion', serverVersions)
+def test_parity_stream(serverVersion):
+    # one decoder for all messages, as on a connection
+    fields = [messages[name] for name in sorted(messages)]
+    results = []
+    for decoderClass in (ibapi.decoder.Decoder, FastDecoder):
+        decoder = decoderClass(Recorder(), serverVersion)
+        for f in fields:
+            try:
+                decoder.interpret(list(f))
+            except Exception:
+                pass
+        results.append(decoder.wrapper.calls)
+    assert results[0] == results[1]
+    assert results[0]
@@ -0,0 +1,61 @@
+"""
+SendQueue writes on disconnect.
+"""
+import asyncio
+
+import pytest
+from ibapi.message import OUT
+
+from tws_async import TWSClient, Stock
+from tws_async.mockserver import MockServer, MockSession
+from tws_async.sendqueue import SendQueue
+
+
+def test_write_all_ignores_rate_limit():
+    written = []
+    queue = SendQueue(written.append, lambda delay, func: None,
+            maxMsgsPerSec=1)
+    for msg in (b'a', b'b', b'c'):
+        queue.put(msg)
+    queue.writeAll()
+    assert written == [b'abc']
+    assert queue.queueDepth == 0
+
+
+def test_clear_discards():
+    written = []
+    queue = SendQueue(written.append, lambda delay, func: None)
+    queue.put(b'a')
+    queue.clear()
+    queue.writeAll()
+    assert written == []
+
+
+@pytest.mark.parametrize('decodeWorker', [False, True])
+def test_disconnect_flushes(monkeypatch, decodeWorker):
+    received = []
+    onRequest = MockSession._onRequest
+
+    def record(session, fields):
+        received.append(int(fields[0]))
+        onRequest(session, fields)
+
+    monkeypatch.setattr(MockSession, '_onRequest', record)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = MockServer(port=0, tickRate=10)
+    try:
+        loop.run_until_complete(server.start())
+        client = TWSClient()
+        client.decodeWorker = decodeWorker
+        client.connect('127.0.0.1', server.port, clientId=1)
+        loop.run_until_complete(asyncio.sleep(0.1))
+        assert bool(client._worker) == decodeWorker
+        client.reqMktData(client.getReqId(), Stock('AAPL'), '',
+                False, False, [])
+        client.disconnect()
+        loop.run_until_complete(asyncio.sleep(0.2))
+        assert OUT.REQ_MKT_DATA in received
+    finally:
+        server.close()
+        loop.close()
@@ -0,0 +1,53 @@
+"""
+Registration of the subscriptions that TWSClient renews after a reconnect.
+"""
+import asyncio
+
+import pytest
+import ibapi.server_versions as sv
+from ibapi.client import EClient
+
+from tws_async import TWSClient, Stock, TWSException
+from tws_async.capture import NullConnection
+
+
+@pytest.fixture
+def client():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client = TWSClient()
+    client.conn = NullConnection()
+    client.serverVersion_ = sv.MAX_CLIENT_VER
+    client.setConnState(EClient.CONNECTED)
+    client._reqIdSeq = 1
+    yield client
+    loop.close()
+
+
+def test_snapshot_is_not_registered(client):
+    client.reqMktData(1, Stock('AAPL'), '', True, False, [])
+    client.reqMktData(2, Stock('AAPL'), '', False, True, [])
+    client.reqMktData(3, Stock('AAPL'), '', False, False, [])
+    assert list(client._subscriptions) == [3]
+
+
+def test_snapshot_end_drops_subscription(client):
+    client.reqMktData(1, Stock('AAPL'), '', False, False, [])
+    client.tickSnapshotEnd(1)
+    assert not client._subscriptions
+
+
+def test_error_drops_subscription(client):
+    ticker = client.reqTicker(Stock('AAPL'))
+    stream = client.reqTickStream(Stock('UNKNOWN'))
+    client.error(ticker.reqId, 2104, 'Market data farm connection is OK')
+    assert ticker.reqId in client._subscriptions
+    client.error(stream.reqId, 200, 'No security definition')
+    assert list(client._subscriptions) == [ticker.reqId]
+    assert not client._tickStreams
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(stream.__anext__())
+        assert False, 'stream did not end'
+    except TWSException as e:
+        assert e.errorCode == 200
@@ -1,8 +1,52 @@
+import sys
+import types
+import importlib
+
 from .contracts import *
 from .twsclient import *
-from .twsclientqt import *
-from .histrequester import *
+from .ticker import *
+from .tickstream import *
+from .tickrecorder import *
 from . import util
 
+# names that are imported from their module on first use, so that
+# a plain import does not pay for PyQt5 or numpy
+_lazyNames = {
+    'TWSClientQt': 'twsclientqt',
+    'HistRequester': 'histrequester',
+    'HistRequest': 'histrequester',
+    'BarStream': 'histrequester',
+    'BarStore': 'barstore',
+    'TWSClientPool': 'pool',
+    'ContractCache': 'contractcache',
+    'Metrics': 'metrics',
+    'Recorder': 'capture',
+    'Replayer': 'capture',
+    'Resampler': 'resampler',
+    'resample': 'resampler',
+}
+
+
+class _LazyModule(types.ModuleType):
+
+    def __getattr__(self, name):
+        modName = _lazyNames.get(name)
+        if modName is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(
+                    __name__, name))
+        module = importlib.import_module('.' + modName, __name__)
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(types.ModuleType.__dir__(self)) | set(_lazyNames))
+
+
+sys.modules[__name__].__class__ = _LazyModule
+
 __all__ = (['util'] + contracts.__all__ + twsclient.__all__ +
-        twsclient.__all__ + histrequester.__all__)
+        ticker.__all__ + tickstream.__all__ + tickrecorder.__all__ +
+        ['HistRequester', 'HistRequest', 'BarStream', 'BarStore',
+        'TWSClientPool', 'ContractCache', 'Metrics', 'Recorder', 'Replayer',
+        'Resampler', 'resample'])
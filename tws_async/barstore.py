@@ -0,0 +1,257 @@
+import sys
+import array
+import bisect
+import struct
+import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['BarStore']
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+# header of the binary file format: magic, number of bars, flags
+MAGIC = b'TWSBARS1'
+HEADER = struct.Struct('<8sQI12x')
+FLAG_DATE_ONLY = 1
+
+
+class BarStore:
+    """
+    Columnar storage of bars.
+
+    The bar times are stored as int64 seconds since the epoch (UTC),
+    the prices as float64 and the volumes as int64. The columns are NumPy
+    arrays when NumPy is available and typed arrays otherwise.
+
+    Indexing or iterating gives rows of
+    [datetime, open, high, low, close, volume], with the time converted to
+    a datetime (or a date for daily bars) only at that moment. The datetime
+    is in the timezone attribute, or naive UTC when it is None.
+    """
+    names = ('time', 'open', 'high', 'low', 'close', 'volume')
+    _typecodes = ('q', 'd', 'd', 'd', 'd', 'q')
+
+    def __init__(self, dateOnly=False, capacity=256, useNumpy=True):
+        self.dateOnly = dateOnly
+        self.timezone = None
+        self._numpy = useNumpy and np is not None
+        self._size = 0
+        if self._numpy:
+            self._cols = [np.empty(capacity, dtype=t)
+                    for t in self._typecodes]
+        else:
+            self._cols = [array.array(t) for t in self._typecodes]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._size))]
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('bar index out of range')
+        t, o, h, l, c, v = self._cols
+        return [self.toDatetime(t[i]), float(o[i]), float(h[i]),
+                float(l[i]), float(c[i]), int(v[i])]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def __repr__(self):
+        return '<BarStore with {} bars>'.format(self._size)
+
+    def append(self, time, open, high, low, close, volume):
+        """
+        Add a bar with the time given as seconds since the epoch.
+        """
+        n = self._size
+        cols = self._cols
+        if self._numpy:
+            if n == len(cols[0]):
+                self._grow(2 * n or 256)
+                cols = self._cols
+            cols[0][n] = time
+            cols[1][n] = open
+            cols[2][n] = high
+            cols[3][n] = low
+            cols[4][n] = close
+            cols[5][n] = volume
+        else:
+            cols[0].append(time)
+            cols[1].append(open)
+            cols[2].append(high)
+            cols[3].append(low)
+            cols[4].append(close)
+            cols[5].append(volume)
+        self._size = n + 1
+
+    def update(self, time, open, high, low, close, volume) -> int:
+        """
+        Update the bar with the given time in place, or append it when it
+        is later than the last bar. Return the index of the bar, or -1
+        for an earlier bar that is not in the store.
+        """
+        n = self._size
+        times = self.column('time')
+        if not n or time > times[n - 1]:
+            self.append(time, open, high, low, close, volume)
+            return n
+        i = n - 1 if times[n - 1] == time else \
+                bisect.bisect_left(times, time)
+        if times[i] != time:
+            return -1
+        for col, value in zip(self._cols,
+                (time, open, high, low, close, volume)):
+            col[i] = value
+        return i
+
+    def column(self, name):
+        """
+        Get the column with the given name, without copying.
+        """
+        col = self._cols[self.names.index(name)]
+        return col[:self._size] if self._numpy else col
+
+    time = property(lambda self: self.column('time'))
+    open = property(lambda self: self.column('open'))
+    high = property(lambda self: self.column('high'))
+    low = property(lambda self: self.column('low'))
+    close = property(lambda self: self.column('close'))
+    volume = property(lambda self: self.column('volume'))
+
+    def extend(self, other: 'BarStore'):
+        """
+        Add all bars of the other store.
+        """
+        n = self._size + len(other)
+        if self._numpy:
+            if n > len(self._cols[0]):
+                self._grow(max(n, 2 * self._size))
+            for col, otherCol in zip(self._cols, other._cols):
+                col[self._size:n] = otherCol[:len(other)]
+        else:
+            for col, otherCol in zip(self._cols, other._cols):
+                col.extend(otherCol[:len(other)])
+        self._size = n
+
+    def between(self, start, end) -> 'BarStore':
+        """
+        Get a new store with the bars from time start up to time end,
+        assuming the bars are in order of time.
+        """
+        times = self.column('time')
+        i = bisect.bisect_left(times, start)
+        j = bisect.bisect_left(times, end)
+        store = BarStore(self.dateOnly, 0, self._numpy)
+        store.timezone = self.timezone
+        store._cols = [col[i:j] for col in self._cols]
+        store._size = j - i if j > i else 0
+        return store
+
+    def toDatetime(self, t):
+        """
+        Convert a bar time to a datetime, or to a date for daily bars.
+        """
+        t = int(t)
+        if self.dateOnly:
+            return epochToDate(t)
+        if self.timezone:
+            return datetime.datetime.fromtimestamp(t, self.timezone)
+        return _EPOCH + datetime.timedelta(seconds=t)
+
+    def datetimes(self):
+        """
+        Get the bar times as a list of datetimes (or dates).
+        """
+        return [self.toDatetime(t) for t in self.column('time')]
+
+    def save(self, path):
+        """
+        Write the bars to a binary file, as a header followed by
+        the columns in little-endian byte order.
+        """
+        flags = FLAG_DATE_ONLY if self.dateOnly else 0
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self._size, flags))
+            for col, t in zip(self._cols, self._typecodes):
+                if self._numpy:
+                    data = col[:self._size].astype('<' + t, copy=False)
+                elif sys.byteorder == 'big':
+                    data = array.array(t, col)
+                    data.byteswap()
+                else:
+                    data = col
+                f.write(data.tobytes())
+
+    @classmethod
+    def fromColumns(cls, cols, dateOnly=False) -> 'BarStore':
+        """
+        Create a store that uses the given columns as they are.
+        """
+        store = cls(dateOnly, 0, useNumpy=np is not None and
+                isinstance(cols[0], np.ndarray))
+        store._cols = list(cols)
+        store._size = len(cols[0])
+        return store
+
+    @classmethod
+    def stitch(cls, stores, dateOnly=False) -> 'BarStore':
+        """
+        Combine the bars of the given stores into a new store that is
+        in order of time, keeping only the last bar of the stores for
+        any duplicate time.
+        """
+        stores = [s for s in stores if len(s)]
+        if not stores:
+            return cls(dateOnly)
+        if stores[0]._numpy:
+            cols = [np.concatenate([s._cols[i][:len(s)] for s in stores])
+                    for i in range(len(cls.names))]
+            # stable sort, so that of equal times the last one is last
+            order = np.argsort(cols[0], kind='mergesort')
+            cols = [col[order] for col in cols]
+            times = cols[0]
+            keep = np.ones(len(times), dtype=bool)
+            keep[:-1] = times[1:] != times[:-1]
+            cols = [col[keep] for col in cols]
+        else:
+            rows = {}
+            for s in stores:
+                for i, t in enumerate(s._cols[0][:len(s)]):
+                    rows[t] = [col[i] for col in s._cols]
+            rows = [rows[t] for t in sorted(rows)]
+            cols = [array.array(t, (row[i] for row in rows))
+                    for i, t in enumerate(cls._typecodes)]
+        store = cls.fromColumns(cols, dateOnly)
+        store.timezone = stores[0].timezone
+        return store
+
+    def _grow(self, capacity):
+        newCols = []
+        for col in self._cols:
+            newCol = np.empty(capacity, dtype=col.dtype)
+            newCol[:self._size] = col[:self._size]
+            newCols.append(newCol)
+        self._cols = newCols
+
+
+def dateToEpoch(date: datetime.date) -> int:
+    """
+    Seconds since the epoch of the start of the given date (UTC).
+    """
+    return (date.toordinal() - _EPOCH_ORDINAL) * 86400
+
+
+def epochToDate(t: int) -> datetime.date:
+    """
+    Get the (UTC) date of the given seconds since the epoch.
+    """
+    return datetime.date.fromordinal(_EPOCH_ORDINAL + t // 86400)
@@ -0,0 +1,208 @@
+import time
+import struct
+import asyncio
+import logging
+
+import ibapi.decoder
+from ibapi.client import EClient
+
+from .framer import Framer
+from .fastdecoder import FastDecoder
+
+__all__ = ['Recorder', 'Replayer']
+
+# a capture file is a sequence of records, each with a header of
+# monotonic time, kind and payload length
+_header = struct.Struct('<dBI')
+DATA, SESSION = range(2)
+# payload of a SESSION record: the server version, 0 if the handshake
+# is part of the captured data
+_session = struct.Struct('<I')
+
+
+class Recorder:
+    """
+    Record the raw data received by a TWSClient to an append-only
+    capture file, for replay with the Replayer.
+
+    A new session is marked when recording starts and on every new
+    connection. The data read by a decode worker is not seen and
+    not recorded.
+    """
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.numBytes = 0
+        self._file = None
+        self._session = None
+        self._leftover = 0
+        self._onSocketHasData = None
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def start(self):
+        """
+        Start recording by hooking into the data handling of the client.
+        """
+        if self._file:
+            return
+        self._file = open(self.path, 'ab')
+        self._session = None
+        self._onSocketHasData = self.client._onSocketHasData
+        self.client._onSocketHasData = self._onData
+        if self.client.conn:
+            self.client.conn.hasData = self._onData
+        self._logger.info('Recording to {}'.format(self.path))
+
+    def stop(self):
+        """
+        Stop recording and close the file.
+        """
+        if not self._file:
+            return
+        client = self.client
+        del client._onSocketHasData
+        if client.conn:
+            client.conn.hasData = client._onSocketHasData
+        self._file.close()
+        self._file = None
+
+    def _onData(self, data):
+        client = self.client
+        serverVersion = client.serverVersion_ or 0
+        now = time.monotonic()
+        if self._session is None or (self._session and not serverVersion):
+            # start of recording or new connection; include the start
+            # of a partial message that is in the framer already
+            self._write(now, SESSION, _session.pack(serverVersion))
+            self._leftover = 0
+            if data is not None and len(client._framer):
+                self._writeUnread(now, 0)
+        self._session = serverVersion
+        if data is None:
+            # read into the framer already, after the leftover of
+            # the previous read
+            self._writeUnread(now, self._leftover)
+        else:
+            self._write(now, DATA, data)
+        self._onSocketHasData(data)
+        self._leftover = len(client._framer)
+
+    def _writeUnread(self, t, offset):
+        # write the unread data of the framer without copying it
+        with self.client._framer.unreadView(offset) as view:
+            self._write(t, DATA, view)
+
+    def _write(self, t, kind, payload):
+        self._file.write(_header.pack(t, kind, len(payload)))
+        self._file.write(payload)
+        self.numBytes += len(payload)
+
+
+class NullConnection:
+    """
+    Stand-in for the connection of a client that is fed replayed data;
+    sent messages are dropped.
+    """
+    def disconnect(self):
+        pass
+
+    def isConnected(self):
+        return True
+
+    def sendMsg(self, msg):
+        pass
+
+
+class Replayer:
+    """
+    Feed a capture file into the message handling of a TWSClient
+    (or subclass), without a connection.
+
+    The capture is loaded into memory first so that the replay
+    measures the handling of the messages and not the file access.
+    """
+    def __init__(self, path):
+        self.path = path
+        # list of (time, kind, payload)
+        self.records = []
+        self.numMsgs = 0
+        self.numBytes = 0
+        self.load()
+
+    def load(self):
+        with open(self.path, 'rb') as f:
+            buf = f.read()
+        records = []
+        framer = Framer()
+        numMsgs = 0
+        pos = 0
+        while pos + _header.size <= len(buf):
+            t, kind, n = _header.unpack_from(buf, pos)
+            pos += _header.size
+            payload = buf[pos:pos + n]
+            pos += n
+            if len(payload) < n:
+                # truncated by a crash during recording
+                break
+            records.append((t, kind, payload))
+            if kind == SESSION:
+                framer.reset()
+            else:
+                framer.feed(payload)
+                numMsgs += len(framer.frames())
+                self.numBytes += n
+        self.records = records
+        self.numMsgs = numMsgs
+
+    def replay(self, client, speed=0) -> dict:
+        """
+        Replay the capture into the client and return the statistics.
+        See replayAsync.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(self.replayAsync(client, speed))
+
+    async def replayAsync(self, client, speed=0) -> dict:
+        """
+        Replay the capture into the client, as fast as possible for
+        speed 0 or else at the given multiple of the original speed.
+
+        Return a dict with the number of messages and bytes, the
+        elapsed seconds and the rate in messages per second.
+        """
+        t0 = time.perf_counter()
+        start = None
+        for t, kind, payload in self.records:
+            if start is None:
+                start = t
+            if speed:
+                delay = t0 + (t - start) / speed - time.perf_counter()
+                await asyncio.sleep(max(delay, 0))
+            else:
+                # let other tasks run as they would between reads
+                await asyncio.sleep(0)
+            if kind == SESSION:
+                self._startSession(client, _session.unpack(payload)[0])
+            else:
+                client._onSocketHasData(payload)
+        dt = time.perf_counter() - t0
+        return {
+            'messages': self.numMsgs,
+            'bytes': self.numBytes,
+            'seconds': dt,
+            'msgsPerSec': self.numMsgs / dt if dt else 0
+        }
+
+    def _startSession(self, client, serverVersion):
+        # set up the client as if it just connected
+        client.reset()
+        client.conn = NullConnection()
+        client.clientId = 0
+        decoderClass = FastDecoder if client.fastDecoder \
+                else ibapi.decoder.Decoder
+        client.decoder = decoderClass(client.wrapper, None)
+        client.setConnState(EClient.CONNECTING)
+        if serverVersion:
+            client.serverVersion_ = serverVersion
+            client.decoder.serverVersion = serverVersion
+            client.setConnState(EClient.CONNECTED)
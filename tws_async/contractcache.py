@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import collections
+
+from .contracts import keyFields, CompactContract
+
+__all__ = ['ContractCache']
+
+# the fields of a qualified contract that are kept in the cache
+cachedFields = ('conId',) + keyFields
+
+
+def normalizedKey(contract) -> str:
+    """
+    Get a string key of the contract that does not depend on how its
+    identifying fields are spelled, such as 'aapl' versus 'AAPL'
+    or a strike of 100 versus '100.0'.
+    """
+    if contract.conId:
+        return 'conId:{}'.format(contract.conId)
+    values = []
+    for f in keyFields:
+        v = getattr(contract, f, '')
+        if f == 'strike':
+            v = '{:g}'.format(float(v)) if v and float(v) else ''
+        else:
+            v = str(v or '').strip().upper()
+        values.append(v)
+    return '|'.join(values)
+
+
+class ContractCache:
+    """
+    Cache of qualified contracts, kept in memory and in a JSON index file
+    so that it survives restarts.
+
+    Entries are keyed by the normalized identifying fields of the requested
+    contract. They expire ttl seconds after they were qualified and the
+    least recently used entries are evicted beyond maxSize entries.
+    The client can be anything with a contractDetailsAsync method,
+    such as a TWSClient or a TWSClientPool.
+    """
+    def __init__(self, client, path='contracts.json', ttl=7 * 86400,
+            maxSize=100000):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.maxSize = maxSize
+        self.numHits = 0
+        self.numMisses = 0
+        # key -> (time qualified, dict of cachedFields)
+        self._cache = collections.OrderedDict()
+        self._logger = logging.getLogger(__class__.__name__)
+        self.load()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, contract):
+        return self.get(contract) is not None
+
+    def get(self, contract) -> dict:
+        """
+        Get the dict of qualified fields of the contract,
+        or None if the contract is not cached (or expired).
+        """
+        key = normalizedKey(contract)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        t, fields = entry
+        if time.time() - t > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return fields
+
+    def put(self, contract, qualified) -> dict:
+        """
+        Store the fields of the qualified contract under the key of
+        the requested contract (and under its conId) and return them.
+        """
+        fields = {f: getattr(qualified, f) for f in cachedFields}
+        entry = (time.time(), fields)
+        for key in {normalizedKey(contract), normalizedKey(qualified)}:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+        while len(self._cache) > self.maxSize:
+            self._cache.popitem(last=False)
+        return fields
+
+    def clear(self):
+        self._cache.clear()
+
+    async def qualifyAsync(self, *contracts, timeout=None) -> list:
+        """
+        Fill in the conId, localSymbol and other missing fields of the
+        contracts, in place. Contracts that are not cached are qualified
+        with one concurrent contract details request per distinct contract.
+
+        Return the list of contracts that could be qualified; contracts
+        that are ambiguous or unknown to the server are left out.
+        A CompactContract is immutable, so it is not changed and its
+        qualified copy is returned instead.
+        """
+        found = {}
+        misses = collections.OrderedDict()
+        for c in contracts:
+            key = normalizedKey(c)
+            fields = self.get(c)
+            if fields is None:
+                misses.setdefault(key, c)
+            else:
+                found[key] = fields
+        self.numMisses += len(misses)
+        self.numHits += len(contracts) - len(misses)
+        if misses:
+            results = await asyncio.gather(
+                    *[self.client.contractDetailsAsync(c, timeout=timeout)
+                    for c in misses.values()], return_exceptions=True)
+            for (key, c), result in zip(misses.items(), results):
+                if isinstance(result, Exception):
+                    self._logger.warning('Error qualifying {}: {!r}'.format(
+                            key, result))
+                elif len(result) != 1:
+                    self._logger.warning('{} contracts match {}'.format(
+                            len(result), key))
+                else:
+                    found[key] = self.put(c, result[0].contract)
+            self.save()
+        qualified = []
+        for c in contracts:
+            fields = found.get(normalizedKey(c))
+            if fields is not None:
+                qualified.append(self._fillIn(c, fields))
+        return qualified
+
+    def load(self):
+        """
+        Read the index file, skipping the expired entries.
+        """
+        self._cache.clear()
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            index = json.load(f, object_pairs_hook=collections.OrderedDict)
+        now = time.time()
+        for key, (t, fields) in index.items():
+            if now - t <= self.ttl:
+                self._cache[key] = (t, fields)
+
+    def save(self):
+        """
+        Write the index file, atomically replacing the previous version.
+        """
+        if not self.path:
+            return
+        dir = os.path.dirname(self.path)
+        if dir and not os.path.isdir(dir):
+            os.makedirs(dir)
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(self._cache, f)
+        os.replace(tmpPath, self.path)
+
+    @staticmethod
+    def _fillIn(contract, fields):
+        if contract.exchange:
+            # keep the exchange that was asked for, such as SMART
+            fields = dict(fields, exchange=contract.exchange)
+        if isinstance(contract, CompactContract):
+            return CompactContract(**fields)
+        for f, v in fields.items():
+            setattr(contract, f, v)
+        return contract
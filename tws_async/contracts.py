@@ -1,7 +1,15 @@
+import weakref
+import operator
+
 import ibapi.contract
 
 __all__ = ['Contract', 'Stock', 'Option', 'Future', 'Forex', 'Index',
-        'CFD', 'Commodity']
+        'CFD', 'Commodity', 'CompactContract', 'contractKey']
+
+# the fields that identify a contract when there is no conId
+keyFields = ('secType', 'symbol', 'lastTradeDateOrContractMonth', 'strike',
+        'right', 'multiplier', 'exchange', 'primaryExchange', 'currency',
+        'localSymbol', 'tradingClass')
 
 
 class Contract(ibapi.contract.Contract):
@@ -70,3 +78,121 @@ class Commodity(Contract):
         Contract.__init__(self, secType='CMDTY', symbol=symbol,
                 exchange=exchange, currency=currency, **kwargs)
 
+
+class CompactContract:
+    """
+    Immutable contract value that has only the conId and the identifying
+    fields, for holding and looking up many contracts cheaply.
+
+    Contracts are equal when their conIds are equal or, without conId,
+    when their identifying fields are equal; the hash is computed once.
+    It has the other attributes that requests need as class defaults,
+    so it can be given to the request methods of the client as it is.
+    """
+    __slots__ = ('conId',) + keyFields + ('_hash', '__weakref__')
+
+    includeExpired = False
+    secIdType = ''
+    secId = ''
+    comboLegsDescrip = ''
+    comboLegs = None
+    deltaNeutralContract = None
+
+    _interned = weakref.WeakValueDictionary()
+    _values = operator.attrgetter('conId', *keyFields)
+
+    def __init__(self, conId=0, secType='', symbol='',
+            lastTradeDateOrContractMonth='', strike=0.0, right='',
+            multiplier='', exchange='', primaryExchange='', currency='',
+            localSymbol='', tradingClass=''):
+        setattr_ = object.__setattr__
+        setattr_(self, 'conId', conId)
+        setattr_(self, 'secType', secType)
+        setattr_(self, 'symbol', symbol)
+        setattr_(self, 'lastTradeDateOrContractMonth',
+                lastTradeDateOrContractMonth)
+        setattr_(self, 'strike', strike)
+        setattr_(self, 'right', right)
+        setattr_(self, 'multiplier', multiplier)
+        setattr_(self, 'exchange', exchange)
+        setattr_(self, 'primaryExchange', primaryExchange)
+        setattr_(self, 'currency', currency)
+        setattr_(self, 'localSymbol', localSymbol)
+        setattr_(self, 'tradingClass', tradingClass)
+        setattr_(self, '_hash', hash((conId,) if conId else (secType,
+                symbol, lastTradeDateOrContractMonth, strike, right,
+                multiplier, exchange, primaryExchange, currency, localSymbol,
+                tradingClass)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompactContract is immutable')
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactContract):
+            return NotImplemented
+        if self._hash != other._hash:
+            return False
+        if self.conId or other.conId:
+            return self.conId == other.conId
+        return self._values(self) == self._values(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (CompactContract, self.values())
+
+    def __repr__(self):
+        kwargs = ', '.join('{}={!r}'.format(f, getattr(self, f))
+                for f in self.__slots__[:-2] if getattr(self, f))
+        return 'CompactContract({})'.format(kwargs)
+
+    def values(self) -> tuple:
+        """
+        Get the conId and identifying fields, in the order of
+        the constructor arguments.
+        """
+        return self._values(self)
+
+    @classmethod
+    def fromContract(cls, contract) -> 'CompactContract':
+        """
+        Create from an ibapi contract (or another CompactContract).
+        """
+        if isinstance(contract, CompactContract):
+            return contract
+        return cls(contract.conId, contract.secType, contract.symbol,
+                contract.lastTradeDateOrContractMonth,
+                float(contract.strike or 0), contract.right,
+                str(contract.multiplier), contract.exchange,
+                contract.primaryExchange, contract.currency,
+                contract.localSymbol, contract.tradingClass)
+
+    def toContract(self) -> ibapi.contract.Contract:
+        """
+        Create an ibapi contract with the same fields.
+        """
+        c = ibapi.contract.Contract()
+        for f in self.__slots__[:-2]:
+            setattr(c, f, getattr(self, f))
+        return c
+
+    @classmethod
+    def intern(cls, contract) -> 'CompactContract':
+        """
+        Get the one CompactContract that is equal to the given
+        (ibapi or compact) contract, so that equal contracts that are
+        held in many places share the same object.
+        """
+        c = cls.fromContract(contract)
+        return cls._interned.setdefault(c, c)
+
+
+def contractKey(contract) -> tuple:
+    """
+    Get a hashable key for the given contract, either from its conId or
+    from the fields that identify it.
+    """
+    if contract.conId:
+        return (contract.conId,)
+    return tuple(getattr(contract, f, '') for f in keyFields)
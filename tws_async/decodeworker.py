@@ -0,0 +1,302 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import socket
+import tempfile
+import subprocess
+
+from ibapi.message import IN
+
+from .framer import Framer
+from .fastdecoder import FastDecoder
+
+__all__ = ['DecodeWorker']
+
+# kinds of records in the event ring; a PART record is the start of
+# the payload of the next record, for payloads too large for the ring
+RAW, TICK_PRICE, TICK_SIZE, TICK_GENERIC, CLOSED, WRAP, PART = range(7)
+
+_header = struct.Struct('<II')  # kind, payload length
+_positions = struct.Struct('<QQ')  # write position, read position
+_payloads = {
+    TICK_PRICE: struct.Struct('<iidi'),  # reqId, tickType, price, attribs
+    TICK_SIZE: struct.Struct('<iiq'),  # reqId, tickType, size
+    TICK_GENERIC: struct.Struct('<iid'),  # reqId, tickType, value
+}
+
+
+class EventRing:
+    """
+    Ring buffer of records in shared memory, with one process writing
+    and one process reading.
+
+    Each record has an 8 byte header with its kind and payload length
+    and is padded to a multiple of 8 bytes. Records do not wrap around:
+    when the tail of the ring is too short, the writer skips it.
+    The write and read positions only ever increase and are kept in the
+    first 16 bytes of the shared memory.
+
+    A payload of more than half the ring is written in parts, that the
+    reader joins again.
+
+    The memory is a mapped file, in /dev/shm where available. Without
+    fileno a new file is created, otherwise the given one is mapped.
+    """
+    def __init__(self, size=1 << 22, fileno=None):
+        self.size = size
+        self._file = None
+        if fileno is None:
+            self._file = tempfile.TemporaryFile(
+                    dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            self._file.truncate(16 + size)
+            fileno = self._file.fileno()
+        self.fileno = fileno
+        self._mmap = mmap.mmap(fileno, 16 + size)
+        self._mem = memoryview(self._mmap)
+        self._buf = self._mem[16:]
+        self._writePos, self._readPos = _positions.unpack_from(self._mem, 0)
+        self._parts = []
+
+    def close(self):
+        self._buf.release()
+        self._mem.release()
+        self._mmap.close()
+        if self._file:
+            self._file.close()
+
+    def put(self, kind, payload=b''):
+        """
+        Write a record with the given payload bytes.
+        """
+        # a record of at most half the ring always fits once it is drained
+        maxPart = (self.size // 2 - _header.size) & ~7
+        if len(payload) > maxPart:
+            payload = memoryview(payload)
+            while len(payload) > maxPart:
+                self._put(PART, payload[:maxPart])
+                payload = payload[maxPart:]
+        self._put(kind, payload)
+
+    def _put(self, kind, payload):
+        n = len(payload)
+        offset = self._reserve(_header.size + n)
+        _header.pack_into(self._buf, offset, kind, n)
+        offset += _header.size
+        self._buf[offset:offset + n] = payload
+        self._commit()
+
+    def putStruct(self, kind, *values):
+        """
+        Write a record with the fixed layout payload of the kind.
+        """
+        s = _payloads[kind]
+        offset = self._reserve(_header.size + s.size)
+        _header.pack_into(self._buf, offset, kind, s.size)
+        s.pack_into(self._buf, offset + _header.size, *values)
+        self._commit()
+
+    def _reserve(self, n):
+        # wait for room for n bytes and return their offset
+        n = (n + 7) & ~7
+        size = self.size
+        offset = self._writePos % size
+        tail = size - offset
+        needed = n + tail if tail < n else n
+        while self._writePos + needed - self._readPosition() > size:
+            time.sleep(0.0002)
+        if tail < n:
+            if tail >= _header.size:
+                _header.pack_into(self._buf, offset, WRAP, 0)
+            self._writePos += tail
+            offset = 0
+        self._recordEnd = self._writePos + n
+        return offset
+
+    def _commit(self):
+        self._writePos = self._recordEnd
+        struct.pack_into('<Q', self._mem, 0, self._writePos)
+
+    def _readPosition(self):
+        return struct.unpack_from('<Q', self._mem, 8)[0]
+
+    def pending(self) -> bool:
+        """
+        Return True if there are records left to drain.
+        """
+        return struct.unpack_from('<Q', self._mem, 0)[0] > self._readPos
+
+    def drain(self, maxRecords=0) -> list:
+        """
+        Read the available records, at most maxRecords if non-zero, and
+        return them as a list of (kind, value) tuples. The value is a
+        tuple for the fixed layout kinds and bytes for the others.
+        """
+        writePos = struct.unpack_from('<Q', self._mem, 0)[0]
+        pos = self._readPos
+        buf = self._buf
+        size = self.size
+        records = []
+        while pos < writePos:
+            if len(records) == maxRecords:
+                break
+            offset = pos % size
+            tail = size - offset
+            if tail < _header.size:
+                pos += tail
+                continue
+            kind, n = _header.unpack_from(buf, offset)
+            if kind == WRAP:
+                pos += tail
+                continue
+            start = offset + _header.size
+            pos += (_header.size + n + 7) & ~7
+            s = _payloads.get(kind)
+            if s:
+                records.append((kind, s.unpack_from(buf, start)))
+            elif kind == PART:
+                self._parts.append(buf[start:start + n].tobytes())
+            elif self._parts:
+                self._parts.append(buf[start:start + n].tobytes())
+                records.append((kind, b''.join(self._parts)))
+                self._parts = []
+            else:
+                records.append((kind, buf[start:start + n].tobytes()))
+        self._readPos = pos
+        struct.pack_into('<Q', self._mem, 8, pos)
+        return records
+
+
+class TickDecoder(FastDecoder):
+    """
+    Decoder for the messages that become fixed layout records.
+    """
+    hotMsgIds = [IN.TICK_PRICE, IN.TICK_SIZE, IN.TICK_GENERIC]
+
+
+class RecordWriter:
+    """
+    Wrapper for the decoder in the worker that writes the tick
+    callbacks as records to the ring.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+
+    def tickPrice(self, reqId, tickType, price, attrib):
+        attribs = (attrib.canAutoExecute | attrib.pastLimit << 1 |
+                getattr(attrib, 'preOpen', False) << 2)
+        self.ring.putStruct(TICK_PRICE, reqId, tickType, price, attribs)
+
+    def tickSize(self, reqId, tickType, size):
+        self.ring.putStruct(TICK_SIZE, reqId, tickType, size)
+
+    def tickGeneric(self, reqId, tickType, value):
+        self.ring.putStruct(TICK_GENERIC, reqId, tickType, value)
+
+
+def workerMain(sock, notify, ring, serverVersion, unread):
+    """
+    Read and frame the socket, decode the tick messages to fixed layout
+    records and pass all other messages on as raw records.
+    The notify socket gets a byte after each read from the socket.
+    """
+    hotIds = {b'%d' % msgId for msgId in TickDecoder.hotMsgIds}
+    try:
+        decoder = TickDecoder(RecordWriter(ring), serverVersion)
+        framer = Framer()
+        framer.feed(unread)
+        sock.setblocking(True)
+        while True:
+            for msg in framer.frames():
+                msgId = msg[:msg.find(b'\0')]
+                if msgId in hotIds:
+                    fields = msg.split(b'\0')
+                    fields.pop()
+                    decoder.interpret(fields)
+                else:
+                    ring.put(RAW, msg)
+            notify.send(b'\0')
+            try:
+                n = sock.recv_into(framer.getBuffer(65536))
+            except OSError:
+                n = 0
+            if not n:
+                break
+            framer.bufferUpdated(n)
+    finally:
+        ring.put(CLOSED)
+        notify.send(b'\0')
+
+
+class DecodeWorker:
+    """
+    Process that reads the socket of an established connection and
+    decodes its messages, off the event loop of the client.
+
+    The decoded events come back through an EventRing in shared memory:
+    tickPrice, tickSize and tickGeneric as fixed layout records and
+    other messages as raw records. The notifyFileno becomes readable
+    when there are records to drain.
+
+    The worker is a fresh interpreter that inherits only the file
+    descriptors it needs, so it works on POSIX systems only.
+    """
+    def __init__(self, sock, serverVersion, unread=b'', ringSize=1 << 22):
+        self.ring = EventRing(ringSize)
+        self._sock = sock
+        self._notify, workerNotify = socket.socketpair()
+        self._notify.setblocking(False)
+        fds = (sock.fileno(), workerNotify.fileno(), self.ring.fileno)
+        env = dict(os.environ,
+                PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        self.process = subprocess.Popen([sys.executable, '-m', __name__] +
+                [str(v) for v in fds + (ringSize, serverVersion)],
+                stdin=subprocess.PIPE, pass_fds=fds, env=env)
+        self.process.stdin.write(unread)
+        self.process.stdin.close()
+        workerNotify.close()
+        self.notifyFileno = self._notify.fileno()
+
+    def drain(self, maxRecords=0) -> list:
+        """
+        Clear the notifications and return the available records,
+        at most maxRecords if non-zero.
+        """
+        try:
+            while self._notify.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+        return self.ring.drain(maxRecords)
+
+    def pending(self) -> bool:
+        """
+        Return True if there are records left to drain.
+        """
+        return self.ring.pending()
+
+    def stop(self):
+        """
+        Shut down the connection and stop the worker.
+        """
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self._notify.close()
+        self.ring.close()
+
+
+if __name__ == '__main__':
+    sockFd, notifyFd, ringFd, ringSize, serverVersion = map(int, sys.argv[1:])
+    workerMain(socket.socket(fileno=sockFd),
+            socket.socket(fileno=notifyFd),
+            EventRing(ringSize, ringFd), serverVersion,
+            sys.stdin.buffer.read())
@@ -0,0 +1,142 @@
+import ibapi.decoder
+from ibapi.message import IN
+from ibapi.common import TickAttrib
+from ibapi.ticktype import TickTypeEnum
+import ibapi.server_versions as sv
+
+__all__ = ['FastDecoder']
+
+# tick types of tickPrice that carry a size, and the tick type of that size
+_sizeTickTypes = {
+    TickTypeEnum.BID: TickTypeEnum.BID_SIZE,
+    TickTypeEnum.ASK: TickTypeEnum.ASK_SIZE,
+    TickTypeEnum.LAST: TickTypeEnum.LAST_SIZE,
+    TickTypeEnum.DELAYED_BID: TickTypeEnum.DELAYED_BID_SIZE,
+    TickTypeEnum.DELAYED_ASK: TickTypeEnum.DELAYED_ASK_SIZE,
+    TickTypeEnum.DELAYED_LAST: TickTypeEnum.DELAYED_LAST_SIZE,
+}
+
+_NEVER = 1 << 30
+
+
+class FastDecoder(ibapi.decoder.Decoder):
+    """
+    Decoder with precompiled parsers for the hot market data messages.
+    All other messages are left to ibapi.decoder.Decoder.
+
+    The parsers are built per message id when the server version is known
+    and make exactly the same wrapper calls as the ibapi decoder.
+    """
+    hotMsgIds = [IN.TICK_PRICE, IN.TICK_SIZE, IN.TICK_STRING, IN.TICK_GENERIC]
+
+    def __init__(self, wrapper, serverVersion):
+        self._parsers = {}
+        self._serverVersion = None
+        ibapi.decoder.Decoder.__init__(self, wrapper, serverVersion)
+        # compile again now that the wrapper parameters are discovered
+        self.serverVersion = serverVersion
+
+    @property
+    def serverVersion(self):
+        return self._serverVersion
+
+    @serverVersion.setter
+    def serverVersion(self, serverVersion):
+        self._serverVersion = serverVersion
+        self._parsers = {}
+        if serverVersion:
+            for msgId in self.hotMsgIds:
+                parser = self._compile(msgId)
+                if parser:
+                    self._parsers[b'%d' % msgId] = parser
+
+    def interpret(self, fields):
+        parser = self._parsers.get(fields[0]) if fields else None
+        if parser is None:
+            ibapi.decoder.Decoder.interpret(self, fields)
+        else:
+            parser(fields)
+
+    def _compile(self, msgId):
+        if msgId == IN.TICK_PRICE:
+            return self._compileTickPrice()
+        handleInfo = self.msgId2handleInfo.get(msgId)
+        if handleInfo and handleInfo.wrapperMeth and \
+                handleInfo.wrapperParams is not None:
+            return self._compileWithSignature(handleInfo)
+        return None
+
+    def _compileTickPrice(self):
+        # follows Decoder.processTickPriceMsg
+        tickPrice = self.wrapper.tickPrice
+        tickSize = self.wrapper.tickSize
+        interpret = super().interpret
+        pastLimit = self._serverVersion >= sv.MIN_SERVER_VER_PAST_LIMIT
+        preOpen = self._serverVersion >= getattr(
+                sv, 'MIN_SERVER_VER_PRE_OPEN_BID_ASK', _NEVER)
+        sizeTickTypes = _sizeTickTypes
+
+        def parse(fields):
+            if len(fields) < 7:
+                # let the ibapi decoder deal with the bad message
+                return interpret(fields)
+            reqId = int(fields[2] or 0)
+            tickType = int(fields[3] or 0)
+            price = float(fields[4] or 0)
+            size = int(fields[5] or 0)
+            attrMask = int(fields[6] or 0)
+            attrib = TickAttrib()
+            if pastLimit:
+                attrib.canAutoExecute = attrMask & 1 != 0
+                attrib.pastLimit = attrMask & 2 != 0
+                if preOpen:
+                    attrib.preOpen = attrMask & 4 != 0
+            else:
+                attrib.canAutoExecute = attrMask == 1
+            tickPrice(reqId, tickType, price, attrib)
+            sizeTickType = sizeTickTypes.get(tickType)
+            if sizeTickType is not None:
+                tickSize(reqId, sizeTickType, size)
+
+        return parse
+
+    def _compileWithSignature(self, handleInfo):
+        # follows Decoder.interpretWithSignature
+        method = getattr(self.wrapper, handleInfo.wrapperMeth.__name__)
+        interpret = super().interpret
+        encoding = 'unicode-escape' if self._serverVersion >= getattr(
+                sv, 'MIN_SERVER_VER_ENCODE_MSG_ASCII7', _NEVER) else 'UTF-8'
+
+        def text(field):
+            try:
+                return field.decode(encoding)
+            except UnicodeDecodeError:
+                return field.decode('latin-1')
+
+        # numeric fields are plain ASCII and can be converted directly
+        convs = []
+        for name, param in handleInfo.wrapperParams.items():
+            if name == 'self':
+                continue
+            if param.annotation is int:
+                convs.append(int)
+            elif param.annotation is float:
+                convs.append(float)
+            else:
+                convs.append(text)
+        numFields = len(convs) + 2
+
+        if numFields == 5:
+            conv0, conv1, conv2 = convs
+
+            def parse(fields):
+                if len(fields) != 5:
+                    return interpret(fields)
+                method(conv0(fields[2]), conv1(fields[3]), conv2(fields[4]))
+        else:
+            def parse(fields):
+                if len(fields) != numFields:
+                    return interpret(fields)
+                method(*[conv(f) for conv, f in zip(convs, fields[2:])])
+
+        return parse
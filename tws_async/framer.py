@@ -0,0 +1,120 @@
+import struct
+
+__all__ = ['Framer']
+
+_unpackLength = struct.Struct('>I').unpack_from
+
+
+class Framer:
+    """
+    Incremental splitter of the length-prefixed TWS byte stream into
+    messages.
+
+    Received data is appended to a growable buffer and consumed by
+    advancing a read offset, so that a burst of many small messages
+    costs linear time. The consumed head of the buffer is only
+    reclaimed once it becomes large relative to the unread tail.
+    """
+    def __init__(self, initialSize=65536):
+        self._initialSize = initialSize
+        self.reset()
+
+    def reset(self):
+        self._buf = bytearray(self._initialSize)
+        self._start = 0  # read offset
+        self._end = 0  # write offset
+
+    def __len__(self):
+        """
+        Number of received bytes not yet returned as a message.
+        """
+        return self._end - self._start
+
+    def feed(self, data):
+        """
+        Append received data to the buffer.
+        """
+        n = len(data)
+        self._reserve(n)
+        end = self._end
+        self._buf[end:end + n] = data
+        self._end = end + n
+
+    def getBuffer(self, sizeHint) -> memoryview:
+        """
+        Get a writable view of at least sizeHint free bytes at the end of
+        the buffer, for reading from the socket directly into it.
+        """
+        self._reserve(sizeHint)
+        return memoryview(self._buf)[self._end:]
+
+    def bufferUpdated(self, nbytes):
+        """
+        Register that nbytes were written into the view of getBuffer.
+        """
+        self._end += nbytes
+
+    def unread(self) -> bytes:
+        """
+        Get the bytes that are not returned as a message yet,
+        without removing them.
+        """
+        return bytes(self._buf[self._start:self._end])
+
+    def unreadView(self, offset=0) -> memoryview:
+        """
+        Get a view of the bytes that are not returned as a message yet,
+        from the given offset on, without copying. The view must be
+        released before more data is fed.
+        """
+        return memoryview(self._buf)[self._start + offset:self._end]
+
+    def takeUnread(self) -> bytes:
+        """
+        Remove and return the bytes that are not returned as a message yet.
+        """
+        data = bytes(self._buf[self._start:self._end])
+        self._start = self._end = 0
+        return data
+
+    def frames(self) -> list:
+        """
+        Remove all complete messages from the buffer and return them
+        as a list of bytes (without the length prefix).
+        """
+        buf = self._buf
+        pos = self._start
+        end = self._end
+        msgs = []
+        with memoryview(buf) as view:
+            while end - pos >= 4:
+                # 4 byte prefix tells the message length
+                msgEnd = pos + 4 + _unpackLength(buf, pos)[0]
+                if msgEnd > end:
+                    # insufficient data for now
+                    break
+                msgs.append(view[pos + 4:msgEnd].tobytes())
+                pos = msgEnd
+        if pos == end:
+            self._start = self._end = 0
+        else:
+            self._start = pos
+        return msgs
+
+    def _reserve(self, n):
+        # make room for n more bytes at the write offset
+        buf = self._buf
+        if self._end + n <= len(buf):
+            return
+        size = self._end - self._start
+        if self._start >= size and size + n <= len(buf):
+            # compact: the consumed head outweighs the unread tail
+            buf[:size] = buf[self._start:self._end]
+        else:
+            # grow geometrically to amortize the copying;
+            # a new buffer is allocated so that exported views stay valid
+            newBuf = bytearray(max(2 * len(buf), size + n))
+            newBuf[:size] = buf[self._start:self._end]
+            self._buf = newBuf
+        self._start = 0
+        self._end = size
@@ -1,16 +1,25 @@
 import os
+import time
 import datetime
 import asyncio
+import bisect
 import logging
 import csv
+import collections
+import concurrent.futures
 
 import ibapi
 from .twsclient import TWSClient, iswrapper, TWSException
 from ibapi.wrapper import BarData
+from .barstore import BarStore, dateToEpoch, epochToDate
+from .scheduler import HistScheduler
+from .manifest import Manifest, requestRange, gapDuration
+from .resampler import Resampler, resample
+from .util import durationSeconds, maxDuration, barSizeSeconds
 
 UTC = datetime.timezone.utc
 
-__all__ = ['HistRequester', 'HistRequest']
+__all__ = ['HistRequester', 'HistRequest', 'BarStream']
 
 
 class HistRequest:
@@ -30,46 +39,405 @@ class HistRequest:
         self.formatDate = 1 if barSizeSetting \
                 in ('1 day', '1 week', '1 month') else 2
         self.chartOptions = None
-        self.data = []
+        self.data = BarStore(dateOnly=self.formatDate == 1)
+
+
+class BarStream:
+    """
+    Bars of a historical request that are kept up to date.
+
+    The data attribute is the BarStore of the bars. An update of a bar
+    is applied to it in place and a later bar is appended. Iterating
+    with ``async for`` gives every updated bar as a
+    [datetime, open, high, low, close, volume] list, until the stream
+    is cancelled or fails, for example when the connection is lost and
+    not restored.
+    """
+    def __init__(self, histReq):
+        self.histReq = histReq
+        self.data = histReq.data
+        self.future = None
+        self._backfilled = asyncio.Future()
+        self._updates = asyncio.Queue()
+        self._resamplers = []
+        # time of the last bar before a reconnect
+        self._replayFrom = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        bar = await self._updates.get()
+        if bar is None:
+            # keep the end marker for other iterators
+            self._updates.put_nowait(None)
+            if not self.future.cancelled() and self.future.exception():
+                raise self.future.exception()
+            raise StopAsyncIteration
+        return bar
+
+    def cancel(self):
+        """
+        Stop the updates and cancel the request at the server.
+        """
+        if self.future:
+            self.future.cancel()
+
+    def resample(self, barSize) -> Resampler:
+        """
+        Get a Resampler of the bars to the larger bar size, that is
+        kept up to date with the stream.
+        """
+        resampler = Resampler(barSize, self.data.dateOnly)
+        resampler.extend(self.data)
+        self._resamplers.append(resampler)
+        return resampler
+
+    def addBar(self, time, open, high, low, close, volume):
+        if self._replayFrom is not None and time < self._replayFrom:
+            # a bar from before the reconnect is only an update
+            # when it changed while the connection was lost
+            times = self.data.time
+            j = bisect.bisect_left(times, time)
+            if j < len(self.data) and times[j] == time and \
+                    self.data[j][1:] == [open, high, low, close, volume]:
+                return
+        i = self.data.update(time, open, high, low, close, volume)
+        if i < 0:
+            return
+        for resampler in self._resamplers:
+            resampler.update(time, open, high, low, close, volume)
+        if self._backfilled.done():
+            self._updates.put_nowait(self.data[i])
+
+    def _send(self, requester, reqId):
+        if len(self.data):
+            # after a reconnect the whole duration is sent again
+            self._replayFrom = self.data.time[len(self.data) - 1]
+        requester._sendHistRequest(reqId, self.histReq, '')
+
+    def _onDone(self, future):
+        if not self._backfilled.done():
+            if future.cancelled():
+                self._backfilled.cancel()
+            elif future.exception():
+                self._backfilled.set_exception(future.exception())
+        elif not future.cancelled():
+            # mark the exception as retrieved
+            future.exception()
+        self._updates.put_nowait(None)
+
+
+class WritePipeline:
+    """
+    Storage stage of a download. Results are put in a bounded queue and
+    written one after the other in a thread, after which their ranges
+    are added to the manifest. Putting a result waits while the queue
+    is full.
+
+    The manifest is only changed on the event loop; the thread writes
+    a snapshot of it.
+    """
+    def __init__(self, requester, rootDir, manifest, queueSize=8):
+        self.requester = requester
+        self.rootDir = rootDir
+        self.manifest = manifest
+        self.numBars = 0
+        self.numFiles = 0
+        self.writeSeconds = 0.0
+        self.waitSeconds = 0.0
+        self._unsaved = False
+        self._queue = asyncio.Queue(queueSize)
+        self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self._task = asyncio.ensure_future(self._run())
+        self._logger = logging.getLogger(__class__.__name__)
+
+    async def put(self, filename, end, histReq, data, timezone, fileFormat,
+            key, ranges):
+        """
+        Queue the data of the request for writing to the file. When
+        written, the ranges are added to the manifest under the key.
+        """
+        t0 = time.perf_counter()
+        await self._queue.put((filename, end, histReq, data, timezone,
+                fileFormat, key, ranges))
+        self.waitSeconds += time.perf_counter() - t0
+
+    def register(self, key, start, end, filename):
+        """
+        Add the range of a file that is stored already to the manifest.
+        The manifest is saved with the next written result or on closing.
+        """
+        self.manifest.add(key, start, end, filename)
+        self._unsaved = True
+
+    async def close(self):
+        """
+        Write the queued results and stop.
+        """
+        await self._queue.put(None)
+        await self._task
+        if self._unsaved:
+            await self._saveManifest()
+        self._executor.shutdown()
+
+    async def _saveManifest(self):
+        text = self.manifest.dumps()
+        self._unsaved = False
+        await asyncio.get_event_loop().run_in_executor(self._executor,
+                self.manifest.write, text)
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            filename, end, histReq, data, timezone, fileFormat, key, \
+                    ranges = item
+            t0 = time.perf_counter()
+            try:
+                filename = await loop.run_in_executor(self._executor,
+                        self.requester._store, self.rootDir, filename, end,
+                        histReq, data, timezone, fileFormat)
+                for start, stop in ranges:
+                    self.manifest.add(key, start, stop, filename)
+                    self._unsaved = True
+                if self._unsaved:
+                    await self._saveManifest()
+                self.numBars += len(data)
+                self.numFiles += 1
+                self._logger.info('Downloaded {}, {} bars'.
+                        format(filename, len(data)))
+            except Exception:
+                self._logger.exception('Error writing {}'.format(filename))
+            self.writeSeconds += time.perf_counter() - t0
 
 
 class HistRequester(TWSClient):
     """
     Download historical data and save to CSV files.
+
+    Concurrent requests are paced by the scheduler.
     """
 
     def __init__(self):
         TWSClient.__init__(self)
         self._reqIdSeq = 0
-        self._histReqs = {}
-        self._futs = {}
+        self.scheduler = HistScheduler(self)
+        # timezone of the server login, in which naive end times are given
+        self.serverTimezone = UTC
+        # derive bars from finer cached bars where possible (see barsAsync)
+        self.resampleLocally = False
+        # maximum number of requests whose bars are cached
+        self.barCacheSize = 100
+        self._barCache = collections.OrderedDict()
+        # running totals of the server requests, for the download stats
+        self._stats = {'requests': 0, 'networkSeconds': 0.0,
+                'decodeSeconds': 0.0}
         self._logger = logging.getLogger(__class__.__name__)
 
-    async def histReqAsync(self, req: HistRequest) -> list:
+    async def histReqAsync(self, req: HistRequest, timeout=None) -> BarStore:
         """
         Download historical data for the given request and return
-        the data as a list of [datetime, open, high, low, close, volume] lists.
+        the data as a BarStore. Indexing or iterating it gives
+        [datetime, open, high, low, close, volume] lists.
+
+        On a timeout (in seconds) the request is cancelled and
+        asyncio.TimeoutError is raised.
         """
         await self.readyEvent.wait()
-        reqId = self.getReqId()
         if not req.endDateTime:
             end = ''
         elif isinstance(req.endDateTime, datetime.datetime):
             end = req.endDateTime.strftime('%Y%m%d %H:%M:%S')
         else:
             end = req.endDateTime.strftime('%Y%m%d 23:59:59')
+
+        def send(reqId):
+            req.data = BarStore(dateOnly=req.formatDate == 1)
+            self._sendHistRequest(reqId, req, end)
+
+        t0 = time.perf_counter()
+        try:
+            await self._startRequest(send, req, timeout,
+                    self.cancelHistoricalData)
+        finally:
+            self._stats['requests'] += 1
+            self._stats['networkSeconds'] += time.perf_counter() - t0
+        return req.data
+
+    async def histStreamAsync(self, req: HistRequest, timeout=None) \
+            -> BarStream:
+        """
+        Download historical data for the given request up to now and
+        keep it up to date. Return a BarStream when the bars up to now
+        are in; its data has the bars and iterating it gives the updates.
+        The endDateTime of the request is not used.
+
+        On a timeout (in seconds) of the download of the bars up to now,
+        the request is cancelled and asyncio.TimeoutError is raised.
+        After a reconnect the request is renewed and the missed bars
+        are filled in as updates; of the bars that are sent again, only
+        the ones that changed are updates.
+        """
+        await self.readyEvent.wait()
+        req.keepUptoDate = True
+        req.data = BarStore(dateOnly=req.formatDate == 1)
+        stream = BarStream(req)
+        stream.future = self._startRequest(
+                lambda reqId: stream._send(self, reqId),
+                stream, timeout, self.cancelHistoricalData)
+        stream.future.add_done_callback(stream._onDone)
+        try:
+            await stream._backfilled
+        except asyncio.CancelledError:
+            stream.cancel()
+            raise
+        return stream
+
+    def _sendHistRequest(self, reqId, req, end):
         self.reqHistoricalData(reqId, req.contract, end,
                 req.durationStr, req.barSizeSetting, req.whatToShow,
-                req.useRTH, formatDate=req.formatDate, keepUpToDate=req.keepUptoDate,
-                chartOptions=req.chartOptions)
-        self._histReqs[reqId] = req
-        fut = asyncio.Future()
-        self._futs[reqId] = fut
-        await fut
-        return fut.result().data
+                req.useRTH, formatDate=req.formatDate,
+                keepUpToDate=req.keepUptoDate, chartOptions=req.chartOptions)
+
+    async def barsAsync(self, histReq: HistRequest) -> BarStore:
+        """
+        Get the bars of the historical request through the scheduler.
+
+        With resampleLocally the bars of completed requests with a fixed
+        end are cached, and the bars of a request that can be resampled
+        from finer cached bars of the same contract, whatToShow and
+        useRTH are derived locally. Only the parts of the range that
+        cannot be derived are requested from the server.
+
+        The resampled bars start at multiples of the bar size in UTC,
+        as the intraday bars of the server do for exchanges with
+        a whole-hour timezone offset. Daily and longer bars follow the
+        trading sessions and are always requested from the server.
+        """
+        if not self.resampleLocally:
+            return await self.scheduler.submit(histReq)
+        reqRange = requestRange(histReq, self.serverTimezone)
+        derived = self._resampleCached(histReq, reqRange) \
+                if reqRange else None
+        if derived is None:
+            data = await self.scheduler.submit(histReq)
+            if reqRange:
+                self._cacheBars(histReq, reqRange, data)
+            return data
+        data, (start, end) = derived
+        gaps = [gap for gap in ((reqRange[0], start), (end, reqRange[1]))
+                if gap[0] < gap[1]]
+        if gaps:
+            results = await asyncio.gather(*[
+                    self.barsAsync(self._gapRequest(histReq, *gap))
+                    for gap in gaps])
+            data = BarStore.stitch([data] + [result.between(*gap)
+                    for result, gap in zip(results, gaps)],
+                    histReq.formatDate == 1)
+        self._logger.debug('Resampled {} {} bars locally'.format(
+                len(data), histReq.barSizeSetting))
+        histReq.data = data
+        return data
+
+    def _barCacheKey(self, histReq):
+        return (self.getContractName(histReq.contract), histReq.whatToShow,
+                bool(histReq.useRTH))
+
+    def _cacheBars(self, histReq, reqRange, data):
+        if histReq.formatDate == 1:
+            return
+        key = (self._barCacheKey(histReq),
+                barSizeSeconds(histReq.barSizeSetting)) + tuple(reqRange)
+        self._barCache[key] = data
+        self._barCache.move_to_end(key)
+        while len(self._barCache) > self.barCacheSize:
+            self._barCache.popitem(last=False)
+
+    def _resampleCached(self, histReq, reqRange):
+        """
+        Resample the cached bars that cover the largest part of the
+        request range, in whole bars of the request. Return the bars
+        and the (start, end) range they cover, or None.
+        """
+        barSize = barSizeSeconds(histReq.barSizeSetting)
+        if histReq.formatDate == 1 or barSize >= 86400:
+            return None
+        cacheKey = self._barCacheKey(histReq)
+        best = None
+        for key in self._barCache:
+            k, size, start, end = key
+            if k != cacheKey or size >= barSize or barSize % size:
+                continue
+            start = max(start, reqRange[0])
+            start += -start % barSize
+            end = min(end, reqRange[1])
+            end -= end % barSize
+            if end > start and (not best or end - start > best[2] - best[1]):
+                best = (key, start, end)
+        if not best:
+            return None
+        key, start, end = best
+        self._barCache.move_to_end(key)
+        data = resample(self._barCache[key].between(start, end), barSize)
+        return data, (start, end)
+
+    async def histRangeAsync(self, histReq: HistRequest, sink=None) \
+            -> BarStore:
+        """
+        Download historical data for a request of any duration and
+        return it as one BarStore in order of time.
+
+        The range of the request is split into chunks that the server
+        accepts for the bar size, which are fetched concurrently with
+        barsAsync. The optional sink is called with the request
+        and the bars of each chunk as soon as the chunk completes.
+        """
+        chunks = self.chunkRequests(histReq)
+        results = [None] * len(chunks)
+
+        async def fetch(i, req, chunkRange):
+            data = (await self.barsAsync(req)).between(*chunkRange)
+            results[i] = data
+            if sink:
+                sink(req, data)
+
+        await asyncio.gather(*[fetch(i, req, chunkRange)
+                for i, (req, chunkRange) in enumerate(chunks)])
+        return BarStore.stitch(results, histReq.formatDate == 1)
+
+    def chunkRequests(self, histReq: HistRequest, start=None, end=None) \
+            -> list:
+        """
+        Split the time range of the historical request, or the given
+        range from start up to end in seconds since the epoch, into
+        chunks that the server accepts for the bar size.
+        Return a list of (HistRequest, (start, end)) tuples, oldest first.
+        """
+        if start is None:
+            start, end = requestRange(histReq, self.serverTimezone) or \
+                    self._rangeUntilNow(histReq)
+        size = durationSeconds(maxDuration(histReq.barSizeSetting))
+        chunks = []
+        t = start
+        while t < end:
+            chunkEnd = min(t + size, end)
+            chunks.append((self._gapRequest(histReq, t, chunkEnd),
+                    (t, chunkEnd)))
+            t = chunkEnd
+        return chunks
+
+    def _rangeUntilNow(self, histReq):
+        end = int(time.time())
+        if histReq.formatDate == 1:
+            end += -end % 86400
+        return end - durationSeconds(histReq.durationStr), end
 
     async def download(self, histReqs: [HistRequest],
-            rootDir: str='data', timezone=UTC):
+            rootDir: str='data', timezone=UTC, fileFormat: str='csv',
+            queueSize: int=8) -> dict:
         """
         Download historical data for the list of historical requests and
         write each result to its own CSV file below the given
@@ -79,42 +447,201 @@ class HistRequester(TWSClient):
         for the timestamps of the bars in the CSV output.
         When the timezone is UTC no additional timezone information is written
         in the output.
-        
-        To avoid pacing violations, one request at a time is submitted
-        to the server.
-        """
-        for histReq in histReqs:
-            filename = self.getCsvFilename(histReq)
-            path = os.path.join(rootDir, filename)
-            if os.path.exists(path):
-                continue
-            try:
-                data = await self.histReqAsync(histReq)
-                dir = os.path.dirname(path)
-                if not os.path.isdir(dir):
-                    os.makedirs(dir)
-                with open(path, 'w', newline='') as f:
-                    csvfile = csv.writer(f)
-                    csvfile.writerow([
-                            'Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-                    for row in data:
-                        if timezone is not UTC and histReq.formatDate == 2:
-                            # write timezone info when timzone is not UTC
-                            dt = row[0]
-                            row[0] = dt.replace(tzinfo=UTC).astimezone(timezone)
-                        csvfile.writerow(row)
-                self._logger.info('Downloaded {}, {} bars'.
-                        format(filename, len(data)))
-            except TWSException as e:
-                self._logger.info('Error downloading {}: {}'.
-                        format(filename, e))
+
+        With fileFormat 'bars' the results are written in binary columnar
+        files instead, with UTC timestamps. Such files can be memory-mapped
+        with util.loadBars, which also takes care of the timezone.
+
+        A request that is too long for the server at its bar size is
+        split into chunks (see chunkRequests), which are stored in their
+        own files as they complete.
+
+        The requests are submitted concurrently through the scheduler,
+        which keeps them within the pacing limits of the server.
+        The results are written by a WritePipeline in a thread, with at
+        most queueSize results waiting, so that fetching the next results
+        overlaps with writing the previous ones.
+
+        A manifest in rootDir keeps track of the time ranges that are
+        already stored, per contract, bar size and tick type. Only the gaps
+        that are missing are requested, and the new bars are written to the
+        CSV file of the request.
+
+        Return a dict with the number of server requests, bars and files,
+        the elapsed seconds and the seconds spent in the stages:
+        networkSeconds for the server requests (summed over the concurrent
+        requests), decodeSeconds for handling the received data,
+        writeSeconds for writing the files and writeWaitSeconds for waiting
+        on a full write queue.
+        """
+        t0 = time.perf_counter()
+        stats0 = dict(self._stats)
+        manifest = Manifest(rootDir)
+        pipeline = WritePipeline(self, rootDir, manifest, queueSize)
+        try:
+            await asyncio.gather(*[self._download(histReq, rootDir, timezone,
+                    fileFormat, manifest, pipeline) for histReq in histReqs])
+        finally:
+            await pipeline.close()
+        stats = {k: v - stats0[k] for k, v in self._stats.items()}
+        stats.update(bars=pipeline.numBars, files=pipeline.numFiles,
+                seconds=time.perf_counter() - t0,
+                writeSeconds=pipeline.writeSeconds,
+                writeWaitSeconds=pipeline.waitSeconds)
+        self._logger.info('Download stats: {}'.format(stats))
+        return stats
+
+    async def _download(self, histReq, rootDir, timezone, fileFormat,
+            manifest, pipeline):
+        filename = self.getFilename(histReq, fileFormat)
+        path = os.path.join(rootDir, filename)
+        key = self.getManifestKey(histReq)
+        reqRange = requestRange(histReq, self.serverTimezone)
+        if not manifest.hasFile(key, filename) and os.path.exists(path):
+            if reqRange:
+                # register a file from before the manifest existed
+                pipeline.register(key, *reqRange, filename)
+            return
+        gaps = manifest.gaps(key, *reqRange) if reqRange else None
+        if gaps == []:
+            return
+        maxSeconds = durationSeconds(maxDuration(histReq.barSizeSetting))
+        if reqRange and reqRange[1] - reqRange[0] > maxSeconds:
+            await asyncio.gather(*[self._downloadChunk(req, chunkRange,
+                    timezone, fileFormat, key, pipeline)
+                    for gap in gaps
+                    for req, chunkRange in self.chunkRequests(histReq, *gap)])
+            return
+        if gaps is None or gaps == [reqRange]:
+            subReqs = [(histReq, reqRange)]
+        else:
+            subReqs = [(self._gapRequest(histReq, *gap), gap) for gap in gaps]
+        try:
+            results = await asyncio.gather(*[self.barsAsync(req)
+                    for req, _ in subReqs])
+        except TWSException as e:
+            self._logger.info('Error downloading {}: {}'.
+                    format(filename, e))
+            return
+        data = results[0]
+        if gaps is not None and subReqs[0][0] is not histReq:
+            # keep only the bars of the gaps
+            data = BarStore(histReq.formatDate == 1)
+            for result, (_, gap) in zip(results, subReqs):
+                data.extend(result.between(*gap))
+        ranges = [gap for _, gap in subReqs] if gaps is not None else []
+        await pipeline.put(filename, reqRange and reqRange[1], histReq, data,
+                timezone, fileFormat, key, ranges)
+
+    async def _downloadChunk(self, req, chunkRange, timezone, fileFormat,
+            key, pipeline):
+        filename = self.getFilename(req, fileFormat)
+        try:
+            data = (await self.barsAsync(req)).between(*chunkRange)
+        except TWSException as e:
+            self._logger.info('Error downloading {}: {}'.
+                    format(filename, e))
+            return
+        await pipeline.put(filename, chunkRange[1], req, data, timezone,
+                fileFormat, key, [chunkRange])
+
+    def _store(self, rootDir, filename, end, histReq, data, timezone,
+            fileFormat) -> str:
+        """
+        Write the data to the file, or to a variant of it when the file
+        exists already, and return the filename that is used.
+        """
+        if os.path.exists(os.path.join(rootDir, filename)):
+            # another request for the same day is stored already
+            filename = self._uniqueFilename(filename, end)
+        self._write(os.path.join(rootDir, filename), histReq, data,
+                timezone, fileFormat)
+        return filename
+
+    def _uniqueFilename(self, filename, end):
+        """
+        Get a variant of the filename with the end time of the data in it.
+        """
+        root, ext = os.path.splitext(filename)
+        return '{}-{}{}'.format(root, datetime.datetime.utcfromtimestamp(
+                end).strftime('%H%M%S'), ext)
+
+    def _write(self, path, histReq, data, timezone, fileFormat):
+        if fileFormat == 'bars':
+            self._writeBars(path, data)
+        else:
+            self._writeCsv(path, histReq, data, timezone)
+
+    def _gapRequest(self, histReq, start, end) -> HistRequest:
+        """
+        Create a request for the time range from start up to end
+        that is otherwise the same as the given request.
+        """
+        if histReq.formatDate == 1:
+            endDateTime = epochToDate(end - 86400)
+        else:
+            endDateTime = datetime.datetime.fromtimestamp(
+                    end, self.serverTimezone).replace(tzinfo=None)
+            if endDateTime.time() == datetime.time():
+                # up to midnight is up to the end of the previous date
+                endDateTime = endDateTime.date() - datetime.timedelta(1)
+        return HistRequest(histReq.contract, endDateTime,
+                gapDuration(start, end, histReq.formatDate == 1),
+                histReq.barSizeSetting, whatToShow=histReq.whatToShow,
+                useRTH=histReq.useRTH)
+
+    def _writeBars(self, path, data):
+        dir = os.path.dirname(path)
+        if not os.path.isdir(dir):
+            os.makedirs(dir)
+        data.save(path)
+
+    def _writeCsv(self, path, histReq, data, timezone):
+        dir = os.path.dirname(path)
+        if not os.path.isdir(dir):
+            os.makedirs(dir)
+        with open(path, 'w', newline='') as f:
+            csvfile = csv.writer(f)
+            csvfile.writerow([
+                    'Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
+            for row in data:
+                if timezone is not UTC and histReq.formatDate == 2:
+                    # write timezone info when timzone is not UTC
+                    dt = row[0]
+                    row[0] = dt.replace(tzinfo=UTC).astimezone(timezone)
+                csvfile.writerow(row)
+
+    def getManifestKey(self, histReq):
+        """
+        Get the key under which the stored time ranges of the request
+        are kept in the manifest.
+        """
+        key = '{}_{}_{}'.format(self.getContractName(histReq.contract),
+                histReq.barSizeSetting.replace(' ', ''), histReq.whatToShow)
+        return key + '_RTH' if histReq.useRTH else key
 
     def getCsvFilename(self, histReq):
         """
         Get relative filename of where the historical data should be saved.
         The name may contain sub directories.
         """
-        c = histReq.contract
+        return self.getFilename(histReq, 'csv')
+
+    def getFilename(self, histReq, ext):
+        """
+        Get relative filename, with the given extension, of where
+        the historical data should be saved.
+        """
+        filename = '{}_{}_{}.{}'.format(
+                self.getContractName(histReq.contract),
+                histReq.barSizeSetting.replace(' ', ''),
+                histReq.endDateTime.strftime('%Y%m%d'), ext)
+        return filename
+
+    def getContractName(self, c):
+        """
+        Get a name for the contract that can be used in filenames.
+        """
         if c.secType == 'CASH':
             name = c.symbol + c.currency
         elif c.secType == 'FUT':
@@ -126,37 +653,57 @@ class HistRequester(TWSClient):
                     c.lastTradeDateOrContractMonth)
         else:
             name = c.localSymbol or c.symbol
+        return name
 
-        filename = '{}_{}_{}.csv'.format(name,
-                histReq.barSizeSetting.replace(' ', ''),
-                histReq.endDateTime.strftime('%Y%m%d'))
-        return filename
+    def _onSocketHasData(self, data):
+        t0 = time.perf_counter()
+        TWSClient._onSocketHasData(self, data)
+        self._stats['decodeSeconds'] += time.perf_counter() - t0
 
-    @iswrapper
-    def historicalData(self, reqId: int, bar: BarData):
-    # def historicalData(self, reqId: int, date: str, open: float, high: float,
-    #         low: float, close: float, volume: int, barCount: int,
-    #         WAP: float, hasGaps: int):
-        histReq = self._histReqs[reqId]
+    def _barTime(self, histReq, bar) -> int:
         if histReq.formatDate == 1:
             # YYYYmmdd
             y = int(bar.date[0:4])
             m = int(bar.date[4:6])
             d = int(bar.date[6:8])
-            dt = datetime.date(y, m, d)
+            return dateToEpoch(datetime.date(y, m, d))
+        return int(bar.date)
+
+    @iswrapper
+    def historicalData(self, reqId: int, bar: BarData):
+    # def historicalData(self, reqId: int, date: str, open: float, high: float,
+    #         low: float, close: float, volume: int, barCount: int,
+    #         WAP: float, hasGaps: int):
+        target = self._requestData(reqId)
+        if target is None:
+            return
+        volume = bar.volume if bar.volume > 0 else 0
+        if isinstance(target, BarStream):
+            target.addBar(self._barTime(target.histReq, bar), bar.open,
+                    bar.high, bar.low, bar.close, volume)
         else:
-            dt = datetime.datetime.utcfromtimestamp(int(bar.date))
-        histReq.data.append([dt, bar.open, bar.high, bar.low, bar.close,
-                             bar.volume if bar.volume > 0 else 0])
+            target.data.append(self._barTime(target, bar), bar.open,
+                    bar.high, bar.low, bar.close, volume)
 
     @iswrapper
     def historicalDataEnd(self, reqId: int, start: str, end: str):
-        histReq = self._histReqs.pop(reqId)
-        fut = self._futs.pop(reqId)
-        fut.set_result(histReq)
+        target = self._requestData(reqId)
+        if isinstance(target, BarStream):
+            # the request stays active for the updates
+            req = self._requests[reqId]
+            if req.timer:
+                req.timer.cancel()
+                req.timer = None
+            if not target._backfilled.done():
+                target._backfilled.set_result(None)
+        else:
+            self._endRequest(reqId)
 
     @iswrapper
-    def error(self, reqId: int, errorCode: int, errorString: str):
-        if reqId in self._histReqs:
-            fut = self._futs.pop(reqId)
-            fut.set_exception(TWSException(errorString))
+    def historicalDataUpdate(self, reqId: int, bar: BarData):
+        stream = self._requestData(reqId)
+        if stream is None:
+            return
+        stream.addBar(self._barTime(stream.histReq, bar), bar.open,
+                bar.high, bar.low, bar.close,
+                bar.volume if bar.volume > 0 else 0)
@@ -0,0 +1,142 @@
+import os
+import json
+import math
+import datetime
+
+from .barstore import dateToEpoch
+from .util import durationSeconds
+
+__all__ = ['Manifest']
+
+UTC = datetime.timezone.utc
+
+
+def localize(dt: datetime.datetime, tz) -> datetime.datetime:
+    """
+    Attach the given timezone to a naive datetime.
+    """
+    if dt.tzinfo:
+        return dt
+    if hasattr(tz, 'localize'):
+        # pytz timezone
+        return tz.localize(dt)
+    return dt.replace(tzinfo=tz)
+
+
+def requestRange(histReq, tz=UTC):
+    """
+    Get the (start, end) time range in seconds since the epoch that
+    is covered by the historical request, or None if the request has no
+    fixed end. Naive end times are taken to be in the given timezone.
+    For daily bars the range is in whole days.
+    """
+    end = histReq.endDateTime
+    if not end:
+        return None
+    if histReq.formatDate == 1:
+        if isinstance(end, datetime.datetime):
+            end = end.date()
+        end = dateToEpoch(end) + 86400
+    elif isinstance(end, datetime.datetime):
+        end = int(localize(end, tz).timestamp())
+    else:
+        # the request is for up to 23:59:59 of the given date
+        dt = datetime.datetime.combine(end, datetime.time(23, 59, 59))
+        end = int(localize(dt, tz).timestamp()) + 1
+    return end - durationSeconds(histReq.durationStr), end
+
+
+class Manifest:
+    """
+    Persistent index of the time ranges of historical data that are
+    stored below a root directory.
+
+    The ranges are kept per key (such as contract, bar size and tick type)
+    as lists of [start, end, filename] with times in seconds since the epoch.
+    The index is a single JSON file, so that startup does not need to
+    look at the data files themselves.
+    """
+    def __init__(self, rootDir: str, filename: str='manifest.json'):
+        self.path = os.path.join(rootDir, filename)
+        self._index = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self._index = json.load(f)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def ranges(self, key) -> list:
+        """
+        Get the list of stored [start, end, filename] ranges for the key.
+        """
+        return self._index.get(key, [])
+
+    def add(self, key, start, end, filename):
+        """
+        Register that the time range from start up to end is stored
+        in the given file (relative to the root directory).
+        """
+        self._index.setdefault(key, []).append([start, end, filename])
+        self._index[key].sort()
+
+    def hasFile(self, key, filename) -> bool:
+        """
+        See if any stored range of the key is in the given file.
+        """
+        return any(f == filename for _, _, f in self.ranges(key))
+
+    def gaps(self, key, start, end) -> list:
+        """
+        Get the list of (start, end) time ranges within the given range
+        that are not stored yet.
+        """
+        gaps = []
+        t = start
+        for rStart, rEnd, _ in self.ranges(key):
+            if rEnd <= t:
+                continue
+            if rStart >= end:
+                break
+            if rStart > t:
+                gaps.append((t, rStart))
+            t = max(t, rEnd)
+        if t < end:
+            gaps.append((t, end))
+        return gaps
+
+    def save(self):
+        """
+        Write the index to disk, atomically replacing the previous version.
+        """
+        self.write(self.dumps())
+
+    def dumps(self) -> str:
+        """
+        Get the index as JSON text, as a snapshot that can be written
+        with write while the index changes.
+        """
+        return json.dumps(self._index)
+
+    def write(self, text: str):
+        """
+        Write the JSON text of the index to disk, atomically replacing
+        the previous version.
+        """
+        dir = os.path.dirname(self.path)
+        if dir and not os.path.isdir(dir):
+            os.makedirs(dir)
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(text)
+        os.replace(tmpPath, self.path)
+
+
+def gapDuration(start, end, dateOnly) -> str:
+    """
+    Get the smallest duration string that covers the time range.
+    """
+    seconds = end - start
+    if seconds <= 86400 and not dateOnly:
+        return '{} S'.format(seconds)
+    return '{} D'.format(math.ceil(seconds / 86400))
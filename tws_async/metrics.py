@@ -0,0 +1,157 @@
+import time
+
+from ibapi.message import IN
+
+__all__ = ['Metrics', 'Histogram']
+
+# message id as received (bytes) to its name
+_msgNames = {str(v).encode(): k for k, v in vars(IN).items()
+        if isinstance(v, int)}
+
+
+class Histogram:
+    """
+    Histogram of non-negative values in power of two buckets:
+    bucket i holds the values v with int(v).bit_length() == i.
+    Percentiles are given as the upper bound of their bucket.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        i = int(value).bit_length()
+        counts = self.counts
+        if i >= len(counts):
+            counts.extend([0] * (i + 1 - len(counts)))
+        counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q) -> float:
+        """
+        Get the upper bound of the bucket of the q-th percentile
+        (0 <= q <= 100), capped by the maximum.
+        """
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(1 << i, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max
+        }
+
+
+class Metrics:
+    """
+    Counters and histograms of the work done by a client, enabled with
+    client.enableMetrics():
+
+    * count, bytes and decode time (in microseconds) per message type;
+    * number of messages per read and bytes buffered per read;
+    * number and age of the outstanding requests;
+    * lag of the event loop (in microseconds), sampled with a timer.
+
+    The callLater function takes a delay and a function, as for the
+    SendQueue, so that the loop lag can be sampled on any event loop.
+    """
+    def __init__(self, client=None, callLater=None, loopLagInterval=0.1):
+        self.client = client
+        self._callLater = callLater
+        self.loopLagInterval = loopLagInterval
+        self._lagDue = 0
+        self._sampling = False
+        self.reset()
+        if callLater and loopLagInterval:
+            self._sampling = True
+            self._scheduleLagSample()
+
+    def reset(self):
+        """
+        Clear all counters and histograms.
+        """
+        self.startTime = time.time()
+        self.msgBytes = {}
+        self.decodeTimes = {}
+        self.framesPerRead = Histogram()
+        self.bytesBuffered = Histogram()
+        self.loopLag = Histogram()
+
+    def stop(self):
+        """
+        Stop sampling the loop lag.
+        """
+        self._sampling = False
+
+    def addRead(self, numFrames, numBytes):
+        """
+        Register a read with the number of complete messages and the
+        number of bytes that were buffered.
+        """
+        self.framesPerRead.add(numFrames)
+        self.bytesBuffered.add(numBytes)
+
+    def addMessage(self, msgId, numBytes, seconds):
+        """
+        Register a message with its id (bytes), size and the time spent
+        decoding and handling it.
+        """
+        hist = self.decodeTimes.get(msgId)
+        if hist is None:
+            hist = self.decodeTimes[msgId] = Histogram()
+            self.msgBytes[msgId] = 0
+        hist.add(1e6 * seconds)
+        self.msgBytes[msgId] += numBytes
+
+    def _scheduleLagSample(self):
+        self._lagDue = time.perf_counter() + self.loopLagInterval
+        self._callLater(self.loopLagInterval, self._sampleLag)
+
+    def _sampleLag(self):
+        if not self._sampling:
+            return
+        lag = time.perf_counter() - self._lagDue
+        self.loopLag.add(1e6 * max(lag, 0))
+        self._scheduleLagSample()
+
+    def snapshot(self) -> dict:
+        """
+        Get the current metrics as a dict of plain values.
+        """
+        now = time.time()
+        requests = getattr(self.client, '_requests', {})
+        startTimes = [req.startTime for req in requests.values()]
+        messages = {}
+        for msgId, hist in self.decodeTimes.items():
+            name = _msgNames.get(msgId, msgId.decode(errors='replace'))
+            messages[name] = {
+                'count': hist.count,
+                'bytes': self.msgBytes[msgId],
+                'decodeUs': hist.snapshot()
+            }
+        return {
+            'seconds': now - self.startTime,
+            'messages': messages,
+            'framesPerRead': self.framesPerRead.snapshot(),
+            'bytesBuffered': self.bytesBuffered.snapshot(),
+            'requests': {
+                'outstanding': len(startTimes),
+                'oldestAge': now - min(startTimes) if startTimes else 0
+            },
+            'loopLagUs': self.loopLag.snapshot()
+        }
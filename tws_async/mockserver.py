@@ -0,0 +1,323 @@
+import sys
+import time
+import random
+import struct
+import asyncio
+import logging
+import datetime
+import zlib
+
+import ibapi.server_versions as sv
+from ibapi.message import IN, OUT
+
+import tws_async.util as util
+from .framer import Framer
+
+__all__ = ['MockServer']
+
+# highest server version whose message layout the mock server speaks
+SERVER_VERSION = 151
+
+
+def makeMsg(*fields) -> bytes:
+    """
+    Encode the fields as a length-prefixed message.
+    """
+    msg = b''.join(b'%s\0' % (
+            f if isinstance(f, bytes) else str(f).encode()) for f in fields)
+    return struct.pack('>I', len(msg)) + msg
+
+
+class MockServer:
+    """
+    Stand-in for a TWS or gateway server, for testing and benchmarking
+    clients without a real server.
+
+    It performs the handshake and replies to startApi with nextValidId.
+    Market data requests get synthetic ticks, streamed at a total rate of
+    tickRate messages per second that is shared by all subscriptions.
+    With latencyTicks, every so many ticks is a tickString with tick type
+    45 whose value is the time.time() at which it was sent.
+    Historical data requests get generated bars, at most maxBars of them,
+    after a delay of histDelay seconds. With keepUpToDate the last bar
+    is then updated every barUpdateInterval seconds, starting a new bar
+    on every fifth update. Contract details requests get one
+    stock contract with a conId derived from the symbol, or error 200
+    for symbols that start with 'UNKNOWN'.
+    """
+    def __init__(self, host='127.0.0.1', port=7497, tickRate=1000,
+            latencyTicks=0, maxBars=100000, histDelay=0.0,
+            barUpdateInterval=0.1):
+        self.host = host
+        self.port = port
+        self.tickRate = tickRate
+        self.latencyTicks = latencyTicks
+        self.maxBars = maxBars
+        self.histDelay = histDelay
+        self.barUpdateInterval = barUpdateInterval
+        self.server = None
+        self.sessions = []
+        self._logger = logging.getLogger(__class__.__name__)
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        self.server = await loop.create_server(lambda: MockSession(self),
+                self.host, self.port)
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]
+        self._logger.info('Mock server listening on {}:{}'.format(
+                self.host, self.port))
+
+    def close(self):
+        for session in list(self.sessions):
+            session.transport.close()
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def run(self):
+        """
+        Start the server and run the asyncio event loop forever.
+        """
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(self.start())
+        loop.run_forever()
+
+
+class MockSession(asyncio.Protocol):
+    """
+    Connection of one client with the mock server.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.serverVersion = None
+        self.framer = Framer()
+        self.subscriptions = []
+        self.histReqs = {}
+        self.numTicks = 0
+        self._handshake = b''
+        self._timer = None
+        self._paused = False
+        self._rnd = random.Random(0)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.sessions.append(self)
+
+    def connection_lost(self, exc):
+        if self._timer:
+            self._timer.cancel()
+        for handle in self.histReqs.values():
+            handle.cancel()
+        self.server.sessions.remove(self)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+
+    def data_received(self, data):
+        if self.serverVersion is None and len(self._handshake) < 4:
+            # strip the 'API\0' prefix of the handshake
+            self._handshake += data
+            if len(self._handshake) < 4:
+                return
+            data = self._handshake[4:]
+        self.framer.feed(data)
+        for msg in self.framer.frames():
+            if self.serverVersion is None:
+                self._onHandshake(msg.decode())
+            else:
+                fields = msg.split(b'\0')
+                fields.pop()
+                self._onRequest(fields)
+
+    def send(self, *fields):
+        self.transport.write(makeMsg(*fields))
+
+    def _onHandshake(self, versions):
+        # such as 'v100..151', optionally followed by connect options
+        versions = versions.split()[0]
+        _, maxVersion = (int(v) for v in versions[1:].split('..'))
+        self.serverVersion = min(maxVersion, SERVER_VERSION)
+        if self.serverVersion < sv.MIN_SERVER_VER_SYNT_REALTIME_BARS:
+            self.transport.close()
+            return
+        connTime = time.strftime('%Y%m%d %H:%M:%S UTC', time.gmtime())
+        self.send(self.serverVersion, connTime)
+
+    def _onRequest(self, fields):
+        msgId = int(fields[0])
+        if msgId == OUT.START_API:
+            self.send(IN.MANAGED_ACCTS, 1, 'DU000000')
+            self.send(IN.NEXT_VALID_ID, 1, 1)
+        elif msgId == OUT.REQ_IDS:
+            self.send(IN.NEXT_VALID_ID, 1, 1)
+        elif msgId == OUT.REQ_MKT_DATA:
+            self._subscribe(int(fields[2]))
+        elif msgId == OUT.CANCEL_MKT_DATA:
+            reqId = int(fields[2])
+            if reqId in self.subscriptions:
+                self.subscriptions.remove(reqId)
+        elif msgId == OUT.REQ_HISTORICAL_DATA:
+            self._reqHistoricalData(fields)
+        elif msgId == OUT.REQ_CONTRACT_DATA:
+            self._reqContractDetails(fields)
+        elif msgId == OUT.CANCEL_HISTORICAL_DATA:
+            handle = self.histReqs.pop(int(fields[2]), None)
+            if handle:
+                handle.cancel()
+
+    def _subscribe(self, reqId):
+        self.subscriptions.append(reqId)
+        if not self._timer:
+            self._t0 = time.monotonic()
+            self._numSent = 0
+            self._streamTicks()
+
+    def _streamTicks(self):
+        # send the ticks that are due and check again in a millisecond
+        self._timer = asyncio.get_event_loop().call_later(
+                0.001, self._streamTicks)
+        if not self.subscriptions or self._paused:
+            self._t0 = time.monotonic()
+            self._numSent = 0
+            return
+        numDue = int((time.monotonic() - self._t0) * self.server.tickRate)
+        n = numDue - self._numSent
+        if n <= 0:
+            return
+        self._numSent = numDue
+        subs = self.subscriptions
+        latencyTicks = self.server.latencyTicks
+        rnd = self._rnd
+        msgs = []
+        for _ in range(n):
+            self.numTicks += 1
+            reqId = subs[(self.numTicks // 2) % len(subs)]
+            if latencyTicks and self.numTicks % latencyTicks == 0:
+                msgs.append(makeMsg(IN.TICK_STRING, 6, reqId, 45,
+                        repr(time.time())))
+            elif self.numTicks & 1:
+                msgs.append(makeMsg(IN.TICK_PRICE, 6, reqId,
+                        rnd.choice((1, 2, 4)),
+                        round(rnd.uniform(99, 101), 2),
+                        rnd.randint(1, 100), 0))
+            else:
+                msgs.append(makeMsg(IN.TICK_SIZE, 6, reqId,
+                        rnd.choice((0, 3, 5, 8)), rnd.randint(1, 10000)))
+        self.transport.write(b''.join(msgs))
+
+    def _reqContractDetails(self, fields):
+        reqId = int(fields[2])
+        conId = int(fields[3] or 0)
+        symbol = fields[4].decode()
+        currency = fields[12].decode() or 'USD'
+        if symbol.startswith('UNKNOWN'):
+            self.send(IN.ERR_MSG, 2, reqId, 200,
+                    'No security definition has been found for the request')
+            return
+        if not symbol:
+            symbol = 'SYM{}'.format(conId)
+        elif not conId:
+            conId = zlib.crc32(symbol.encode()) % 100000000 + 1
+        self.send(IN.CONTRACT_DATA, 8, reqId, symbol, 'STK', '', 0.0, '',
+                'SMART', currency, symbol, symbol, symbol, conId, 0.01, 1, '',
+                'LMT,MKT', 'SMART,ISLAND', 1, 0, symbol + ' INC', 'ISLAND',
+                '', 'Technology', 'Computers', 'Software', 'US/Eastern', '',
+                '', '', 0, 0, 1, '', '', '26,26', '')
+        self.send(IN.CONTRACT_DATA_END, 1, reqId)
+
+    def _reqHistoricalData(self, fields):
+        reqId = int(fields[1])
+        endDateTime = fields[15].decode()
+        barSizeSetting = fields[16].decode()
+        durationStr = fields[17].decode()
+        formatDate = int(fields[20])
+        keepUpToDate = fields[21] == b'1'
+        if endDateTime:
+            end = datetime.datetime.strptime(endDateTime[:17],
+                    '%Y%m%d %H:%M:%S').replace(
+                    tzinfo=datetime.timezone.utc).timestamp()
+        else:
+            end = time.time()
+        try:
+            barSize = util.barSizeSeconds(barSizeSetting)
+            duration = util.durationSeconds(durationStr)
+        except (ValueError, KeyError):
+            self.send(IN.ERR_MSG, 2, reqId, 321,
+                    'Error validating request: invalid bar size or duration')
+            return
+        handle = asyncio.get_event_loop().call_later(self.server.histDelay,
+                self._sendBars, reqId, int(end), barSize, duration,
+                formatDate, keepUpToDate)
+        self.histReqs[reqId] = handle
+
+    def _sendBars(self, reqId, end, barSize, duration, formatDate,
+            keepUpToDate):
+        if self.histReqs.pop(reqId, None) is None or not self.transport:
+            return
+        # the last bar is the one that contains the end time
+        end += -end % barSize
+        numBars = min(duration // barSize, self.server.maxBars)
+        start = end - numBars * barSize
+        rnd = random.Random(reqId)
+        price = 100.0
+        bars = []
+        for i in range(numBars):
+            t = start + i * barSize
+            if barSize >= 86400:
+                date = time.strftime('%Y%m%d', time.gmtime(t))
+            elif formatDate == 1:
+                date = time.strftime('%Y%m%d  %H:%M:%S', time.gmtime(t))
+            else:
+                date = t
+            o = price
+            c = round(o + rnd.gauss(0, 0.1), 2)
+            h = round(max(o, c) + rnd.random() * 0.05, 2)
+            l = round(min(o, c) - rnd.random() * 0.05, 2)
+            price = c
+            bars += [date, o, h, l, c, rnd.randint(0, 1000),
+                    round((o + c) / 2, 2), rnd.randint(1, 50)]
+        fmt = '%Y%m%d  %H:%M:%S'
+        self.send(IN.HISTORICAL_DATA, reqId,
+                time.strftime(fmt, time.gmtime(start)),
+                time.strftime(fmt, time.gmtime(end)), numBars, *bars)
+        if keepUpToDate and numBars:
+            self._updateBar(reqId, end - barSize, barSize, bars[-8:], 0)
+
+    def _updateBar(self, reqId, t, barSize, bar, numUpdates):
+        # update the last bar or start a new one, then schedule the next
+        if not self.transport:
+            return
+        date, o, h, l, c, v, wap, count = bar
+        if numUpdates % 5 == 4:
+            t += barSize
+            o = h = l = c
+            v = count = 0
+            if not isinstance(date, int):
+                fmt = '%Y%m%d' if barSize >= 86400 else '%Y%m%d  %H:%M:%S'
+                date = time.strftime(fmt, time.gmtime(t))
+            else:
+                date = t
+        c = round(c + random.gauss(0, 0.1), 2)
+        h = max(h, c)
+        l = min(l, c)
+        v += random.randint(0, 100)
+        count += 1
+        bar = [date, o, h, l, c, v, wap, count]
+        self.send(IN.HISTORICAL_DATA_UPDATE, reqId, count, date, o, c, h, l,
+                wap, v)
+        self.histReqs[reqId] = asyncio.get_event_loop().call_later(
+                self.server.barUpdateInterval, self._updateBar, reqId, t,
+                barSize, bar, numUpdates + 1)
+
+
+if __name__ == '__main__':
+    util.logToConsole()
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 7497
+    tickRate = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    server = MockServer(port=port, tickRate=tickRate, latencyTicks=100)
+    server.run()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import functools
+
+from .twsclient import TWSException
+from .histrequester import HistRequester
+from .scheduler import HistScheduler
+
+__all__ = ['TWSClientPool']
+
+
+class TWSClientPool:
+    """
+    Pool of clients on one event loop, each with its own connection
+    and clientId.
+
+    Awaitable requests (histReqAsync and any other method whose name ends
+    with 'Async') are routed to the healthy client that has the fewest
+    requests outstanding. A client is healthy when it is connected and
+    has received its next valid id.
+
+    The clients share one scheduler, so that historical requests from
+    download are paced across the pool as a whole.
+    """
+    def __init__(self, size=4, clientClass=HistRequester):
+        self.clients = [clientClass() for _ in range(size)]
+        self._load = [0] * size
+        self.scheduler = HistScheduler(self)
+        for client in self.clients:
+            if hasattr(client, 'scheduler'):
+                client.scheduler = self.scheduler
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def __getattr__(self, name):
+        if name.endswith('Async') and self.clients and \
+                hasattr(self.clients[0], name):
+            return functools.partial(self._call, name)
+        raise AttributeError(name)
+
+    def run(self, coro=None):
+        """
+        Run the event loop forever or until the given coroutine
+        is completed and return its result.
+        """
+        return self.clients[0].run(coro)
+
+    def connect(self, host, port, clientId, asyncConnect=False, timeout=10):
+        """
+        Connect the clients, using consecutive clientIds starting with
+        the given clientId. Unless asyncConnect is set, block until all
+        clients are ready or the timeout has passed.
+        """
+        for i, client in enumerate(self.clients):
+            client.connect(host, port, clientId + i, asyncConnect=True)
+        if not asyncConnect:
+            loop = asyncio.get_event_loop()
+            loop.run_until_complete(self.waitReady(timeout))
+
+    async def waitReady(self, timeout=None):
+        """
+        Wait until all clients are ready, or the timeout has passed.
+        Return the number of healthy clients.
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                    *[c.readyEvent.wait() for c in self.clients]), timeout)
+        except asyncio.TimeoutError:
+            self._logger.warning('Only {} of {} clients are ready'.format(
+                    len(self.healthyClients()), len(self.clients)))
+        return len(self.healthyClients())
+
+    def disconnect(self):
+        for client in self.clients:
+            if client.isConnected():
+                client.disconnect()
+
+    def isHealthy(self, client) -> bool:
+        return client.isConnected() and client.readyEvent.is_set()
+
+    def healthyClients(self) -> list:
+        return [c for c in self.clients if self.isHealthy(c)]
+
+    def load(self) -> list:
+        """
+        Get the number of outstanding requests per client.
+        """
+        return list(self._load)
+
+    async def histReqAsync(self, req):
+        return await self._call('histReqAsync', req)
+
+    async def download(self, *args, **kwargs):
+        """
+        Like HistRequester.download, with the requests spread over
+        the clients of the pool. The request and stage stats are summed
+        over the clients.
+        """
+        stats0 = self._sumStats()
+        stats = await self.clients[0].download(*args, **kwargs)
+        stats.update({k: v - stats0[k]
+                for k, v in self._sumStats().items()})
+        return stats
+
+    def _sumStats(self) -> dict:
+        total = {}
+        for client in self.clients:
+            for k, v in client._stats.items():
+                total[k] = total.get(k, 0) + v
+        return total
+
+    async def _call(self, name, *args, **kwargs):
+        i = self._pick()
+        self._load[i] += 1
+        try:
+            return await getattr(self.clients[i], name)(*args, **kwargs)
+        finally:
+            self._load[i] -= 1
+
+    def _pick(self) -> int:
+        # index of the least loaded healthy client
+        candidates = [(load, i) for i, load in enumerate(self._load)
+                if self.isHealthy(self.clients[i])]
+        if not candidates:
+            raise TWSException('No healthy client in pool')
+        return min(candidates)[1]
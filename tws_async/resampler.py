@@ -0,0 +1,94 @@
+from .barstore import BarStore, np
+from .util import barSizeSeconds
+
+__all__ = ['resample', 'Resampler']
+
+
+def _seconds(barSize) -> int:
+    return barSizeSeconds(barSize) if isinstance(barSize, str) else barSize
+
+
+def _combine(agg, bar):
+    # combine the aggregate of earlier bars with a later bar
+    if agg is None:
+        return bar
+    o, h, l, _, v = agg
+    _, h2, l2, c2, v2 = bar
+    return (o, max(h, h2), min(l, l2), c2, v + v2)
+
+
+def resample(store: BarStore, barSize, origin=0) -> BarStore:
+    """
+    Resample the bars of the store, in order of time, to the larger bar
+    size (a bar size setting such as '5 mins' or a number of seconds).
+
+    The resampled bars start at multiples of the bar size from the
+    origin (in seconds since the epoch) and are combined from the bars
+    that start within them: the first open, highest high, lowest low,
+    last close and total volume.
+    """
+    barSize = _seconds(barSize)
+    n = len(store)
+    if store._numpy and n:
+        times = store.time
+        buckets = times - (times - origin) % barSize
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:] - 1, n - 1]
+        cols = [buckets[starts], store.open[starts],
+                np.maximum.reduceat(store.high, starts),
+                np.minimum.reduceat(store.low, starts),
+                store.close[ends], np.add.reduceat(store.volume, starts)]
+        result = BarStore.fromColumns(cols, store.dateOnly)
+        result.timezone = store.timezone
+        return result
+    resampler = Resampler(barSize, store.dateOnly, origin)
+    resampler.extend(store)
+    resampler.data.timezone = store.timezone
+    return resampler.data
+
+
+class Resampler:
+    """
+    Incremental resampling of bars to a larger bar size, with the
+    same bar boundaries as resample.
+
+    Bars are fed in order of time with update, where the last bar
+    may be updated again (as the bars of a BarStream). The resampled
+    bars are kept in the data BarStore.
+    """
+    def __init__(self, barSize, dateOnly=False, origin=0):
+        self.barSize = _seconds(barSize)
+        self.origin = origin
+        self.data = BarStore(dateOnly)
+        self._bucket = None  # start time of the current resampled bar
+        self._agg = None  # earlier bars within the current resampled bar
+        self._lastTime = None  # start time of the last bar
+        self._last = None  # last bar, which can still change
+
+    def update(self, time, open, high, low, close, volume) -> int:
+        """
+        Add a new bar or update the last one. Return the index of the
+        resampled bar that changed, or -1 for a bar that is too old.
+        """
+        if self._lastTime is not None and time < self._lastTime:
+            return -1
+        if time != self._lastTime:
+            bucket = time - (time - self.origin) % self.barSize
+            if bucket != self._bucket:
+                self._bucket = bucket
+                self._agg = None
+            else:
+                self._agg = _combine(self._agg, self._last)
+            self._lastTime = time
+        self._last = (open, high, low, close, volume)
+        return self.data.update(self._bucket,
+                *_combine(self._agg, self._last))
+
+    def extend(self, store: BarStore):
+        """
+        Feed all bars of the store.
+        """
+        cols = [store.column(name) for name in BarStore.names]
+        for t, o, h, l, c, v in zip(*cols):
+            self.update(int(t), float(o), float(h), float(l), float(c),
+                    int(v))
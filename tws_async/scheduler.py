@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import logging
+import itertools
+import collections
+
+from .contracts import contractKey
+from .twsclient import TWSException
+
+__all__ = ['Pacer', 'HistScheduler']
+
+# error code used by the server for (among others) pacing violations
+PACING_VIOLATION = 162
+
+
+def isPacingViolation(exc) -> bool:
+    return isinstance(exc, TWSException) and \
+            exc.errorCode == PACING_VIOLATION and \
+            'pacing violation' in str(exc).lower()
+
+
+class Pacer:
+    """
+    Model of the pacing rules of historical data requests:
+
+    * no more than maxRequests requests within period seconds;
+    * no identical requests within identicalPeriod seconds;
+    * no more than maxContractRequests requests for the same contract
+      and tick type within contractPeriod seconds.
+
+    Each rule keeps a sliding window of the times that requests were sent,
+    from which the time until the next request is allowed follows.
+    """
+    def __init__(self, maxRequests=60, period=600, identicalPeriod=15,
+            maxContractRequests=6, contractPeriod=2):
+        self.maxRequests = maxRequests
+        self.period = period
+        self.identicalPeriod = identicalPeriod
+        self.maxContractRequests = maxContractRequests
+        self.contractPeriod = contractPeriod
+        self._times = collections.deque()
+        self._identical = {}
+        self._contracts = collections.defaultdict(collections.deque)
+
+    def globalDelay(self, now) -> float:
+        """
+        Seconds from now until any request is allowed.
+        """
+        times = self._times
+        while times and times[0] <= now - self.period:
+            times.popleft()
+        if len(times) < self.maxRequests:
+            return 0
+        return times[0] + self.period - now
+
+    def delay(self, reqKey, cKey, now) -> float:
+        """
+        Seconds from now until the request with the given request key
+        and contract key is allowed.
+        """
+        delay = self.globalDelay(now)
+        last = self._identical.get(reqKey)
+        if last is not None:
+            delay = max(delay, last + self.identicalPeriod - now)
+        times = self._contracts.get(cKey)
+        if times:
+            while times and times[0] <= now - self.contractPeriod:
+                times.popleft()
+            if len(times) >= self.maxContractRequests:
+                delay = max(delay, times[0] + self.contractPeriod - now)
+        return max(delay, 0)
+
+    def record(self, reqKey, cKey, now):
+        """
+        Register that a request was sent.
+        """
+        self._times.append(now)
+        self._identical[reqKey] = now
+        self._contracts[cKey].append(now)
+        if len(self._identical) > 2 * self.maxRequests:
+            # forget requests that can no longer be identical
+            self._identical = {k: t for k, t in self._identical.items()
+                    if t > now - self.identicalPeriod}
+
+
+class HistScheduler:
+    """
+    Keep many historical requests in flight, as far as allowed
+    by the pacer.
+
+    Requests with a higher priority are sent first, requests of
+    equal priority are sent in the order of submission.
+    Requests that fail with a pacing violation are retried after
+    retryDelay seconds, doubling the delay on every retry.
+    The requester can be any object with a histReqAsync method.
+    """
+    def __init__(self, requester, maxInFlight=50, pacer=None,
+            maxRetries=3, retryDelay=15):
+        self.requester = requester
+        self.maxInFlight = maxInFlight
+        self.pacer = pacer or Pacer()
+        self.maxRetries = maxRetries
+        self.retryDelay = retryDelay
+        self._queue = []
+        self._seq = itertools.count()
+        self._numInFlight = 0
+        self._timer = None
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def __len__(self):
+        """
+        Number of requests that are waiting to be sent.
+        """
+        return len(self._queue)
+
+    @property
+    def numInFlight(self):
+        return self._numInFlight
+
+    def submit(self, histReq, priority=0) -> asyncio.Future:
+        """
+        Schedule the given historical request and return a future
+        of its data.
+        """
+        future = asyncio.Future()
+        self._push(priority, histReq, future, 0)
+        return future
+
+    def _push(self, priority, histReq, future, numRetries):
+        heapq.heappush(self._queue,
+                (-priority, next(self._seq), histReq, future, numRetries))
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        loop = asyncio.get_event_loop()
+        if self._timer:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._timer = None
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        pacer = self.pacer
+        minDelay = None
+        blocked = []
+        while self._queue and self._numInFlight < self.maxInFlight:
+            item = heapq.heappop(self._queue)
+            _, _, histReq, future, _ = item
+            if future.done():
+                # cancelled by the caller
+                continue
+            globalDelay = pacer.globalDelay(now)
+            if globalDelay:
+                blocked.append(item)
+                minDelay = globalDelay
+                break
+            reqKey, cKey = self._keys(histReq)
+            delay = pacer.delay(reqKey, cKey, now)
+            if delay:
+                blocked.append(item)
+                minDelay = delay if minDelay is None else min(minDelay, delay)
+                continue
+            pacer.record(reqKey, cKey, now)
+            self._start(item)
+        for item in blocked:
+            heapq.heappush(self._queue, item)
+        if minDelay is not None:
+            self._schedule(minDelay)
+
+    def _start(self, item):
+        priority, _, histReq, future, numRetries = item
+        self._numInFlight += 1
+        task = asyncio.ensure_future(self.requester.histReqAsync(histReq))
+
+        def onDone(task):
+            self._numInFlight -= 1
+            if future.done():
+                pass
+            elif task.cancelled():
+                future.cancel()
+            elif task.exception():
+                exc = task.exception()
+                if isPacingViolation(exc) and numRetries < self.maxRetries:
+                    delay = self.retryDelay * 2 ** numRetries
+                    self._logger.warning('Pacing violation, retrying '
+                            'in {} seconds'.format(delay))
+                    asyncio.get_event_loop().call_later(delay, self._push,
+                            -priority, histReq, future, numRetries + 1)
+                else:
+                    future.set_exception(exc)
+            else:
+                future.set_result(task.result())
+            self._schedule(0)
+
+        task.add_done_callback(onDone)
+
+    @staticmethod
+    def _keys(histReq):
+        cKey = (contractKey(histReq.contract), histReq.whatToShow)
+        reqKey = (cKey, str(histReq.endDateTime), histReq.durationStr,
+                histReq.barSizeSetting, histReq.useRTH)
+        return reqKey, cKey
@@ -0,0 +1,112 @@
+import time
+import collections
+
+__all__ = ['SendQueue']
+
+
+class SendQueue:
+    """
+    Outbound pipeline for messages to the server.
+
+    The messages that are sent during one iteration of the event loop
+    are joined into a single write. No more than maxMsgsPerSec messages
+    are written within any one second (a falsy value means no limit);
+    messages beyond that wait in the queue.
+
+    The write function takes the bytes to write and callLater(delay, func)
+    schedules a function on the event loop.
+    """
+    def __init__(self, write, callLater, maxMsgsPerSec=45):
+        self._write = write
+        self._callLater = callLater
+        self.maxMsgsPerSec = maxMsgsPerSec
+        self._queue = collections.deque()
+        self._sendTimes = collections.deque()
+        self._scheduled = False
+        self.numMsgs = 0
+        self.numWrites = 0
+        self.totalDelay = 0.0
+        self.maxDelay = 0.0
+
+    @property
+    def queueDepth(self) -> int:
+        """
+        Number of messages waiting to be written.
+        """
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the queue: written messages, number of writes,
+        queue depth and the total and maximum time that messages waited
+        in the queue.
+        """
+        return dict(numMsgs=self.numMsgs, numWrites=self.numWrites,
+                queueDepth=self.queueDepth, totalDelay=self.totalDelay,
+                maxDelay=self.maxDelay)
+
+    def put(self, msg: bytes):
+        """
+        Queue the message for writing.
+        """
+        self._queue.append((msg, time.monotonic()))
+        if not self._scheduled:
+            self._scheduled = True
+            self._callLater(0, self._flush)
+
+    def clear(self):
+        """
+        Discard all queued messages, as when the connection is lost.
+        """
+        self._queue.clear()
+
+    def writeAll(self):
+        """
+        Write all queued messages at once, ignoring the rate limit,
+        as before closing the connection.
+        """
+        if not self._queue:
+            return
+        now = time.monotonic()
+        msgs = []
+        for msg, t in self._queue:
+            msgs.append(msg)
+            delay = now - t
+            self.totalDelay += delay
+            if delay > self.maxDelay:
+                self.maxDelay = delay
+        self._queue.clear()
+        self._write(b''.join(msgs))
+        self.numMsgs += len(msgs)
+        self.numWrites += 1
+
+    def _flush(self):
+        self._scheduled = False
+        queue = self._queue
+        sendTimes = self._sendTimes
+        now = time.monotonic()
+        if self.maxMsgsPerSec:
+            while sendTimes and sendTimes[0] <= now - 1:
+                sendTimes.popleft()
+            budget = self.maxMsgsPerSec - len(sendTimes)
+        else:
+            budget = len(queue)
+        msgs = []
+        while queue and budget > 0:
+            msg, t = queue.popleft()
+            msgs.append(msg)
+            delay = now - t
+            self.totalDelay += delay
+            if delay > self.maxDelay:
+                self.maxDelay = delay
+            if self.maxMsgsPerSec:
+                sendTimes.append(now)
+            budget -= 1
+        if msgs:
+            self._write(b''.join(msgs))
+            self.numMsgs += len(msgs)
+            self.numWrites += 1
+        if queue:
+            # wait until the oldest write leaves the one second window
+            self._scheduled = True
+            self._callLater(sendTimes[0] + 1 - now, self._flush)
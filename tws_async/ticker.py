@@ -0,0 +1,60 @@
+from ibapi.ticktype import TickTypeEnum
+
+__all__ = ['Ticker']
+
+
+def _fieldMap(**names):
+    # map the tick types, including the delayed ones, to Ticker fields
+    m = {}
+    for field, tickNames in names.items():
+        for tickName in tickNames:
+            for prefix in ('', 'DELAYED_'):
+                tickType = getattr(TickTypeEnum, prefix + tickName, None)
+                if tickType is not None:
+                    m[tickType] = field
+    return m
+
+
+_fields = _fieldMap(
+        bid=['BID'], ask=['ASK'], last=['LAST'], high=['HIGH'], low=['LOW'],
+        close=['CLOSE'], open=['OPEN'],
+        bidSize=['BID_SIZE'], askSize=['ASK_SIZE'], lastSize=['LAST_SIZE'],
+        volume=['VOLUME'], halted=['HALTED'])
+
+
+class Ticker:
+    """
+    Latest market data of one subscription, updated in place.
+
+    Ticks that have no field of their own are kept in the ticks dict,
+    keyed by tick type.
+    """
+    __slots__ = ('reqId', 'contract', 'time', 'bid', 'bidSize', 'ask',
+            'askSize', 'last', 'lastSize', 'volume', 'open', 'high', 'low',
+            'close', 'halted', 'ticks')
+
+    def __init__(self, reqId, contract):
+        self.reqId = reqId
+        self.contract = contract
+        self.time = None
+        self.bid = self.ask = self.last = float('nan')
+        self.open = self.high = self.low = self.close = float('nan')
+        self.bidSize = self.askSize = self.lastSize = self.volume = 0
+        self.halted = float('nan')
+        self.ticks = {}
+
+    def __repr__(self):
+        return '<Ticker {} bid={}x{} ask={}x{} last={}x{}>'.format(
+                getattr(self.contract, 'symbol', self.reqId),
+                self.bid, self.bidSize, self.ask, self.askSize,
+                self.last, self.lastSize)
+
+    def update(self, tickType, value):
+        """
+        Update the field of the given tick type with the new value.
+        """
+        field = _fields.get(tickType)
+        if field:
+            setattr(self, field, value)
+        else:
+            self.ticks[tickType] = value
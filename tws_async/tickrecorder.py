@@ -0,0 +1,290 @@
+import os
+import glob
+import json
+import mmap
+import time
+import queue
+import struct
+import asyncio
+import logging
+import threading
+import collections
+
+from .contracts import keyFields
+
+__all__ = ['TickRecorder', 'loadTicks', 'tickChunks']
+
+# kinds of tick
+PRICE, SIZE, GENERIC = range(3)
+
+# fsync policies
+FSYNC_NEVER = 'never'
+FSYNC_ROTATE = 'rotate'
+FSYNC_BATCH = 'batch'
+
+# a chunk file is a header of magic and record size, followed by
+# fixed-size records of time, reqId, tick type, kind and value
+MAGIC = b'TWSTICK1'
+HEADER = struct.Struct('<8sI20x')
+RECORD = struct.Struct('<diHBxd')
+# the same layout as NumPy dtype
+DTYPE = [('time', '<f8'), ('reqId', '<i4'), ('tickType', '<u2'),
+        ('kind', 'u1'), ('pad', 'u1'), ('value', '<f8')]
+
+# marker in the write queue to start a new chunk
+_ROTATE = object()
+
+
+class TickRecorder:
+    """
+    Record the numeric ticks (price, size and generic) that a TWSClient
+    receives to append-only binary chunk files, without blocking the
+    event loop on file access.
+
+    The ticks are packed into preallocated batches of batchSize records.
+    A full batch, or a partial one after flushInterval seconds, is handed
+    to a writer thread that appends it to the current chunk file. A new
+    chunk is started when the chunk reaches chunkSize bytes and after a
+    reconnect, when the reqIds change. Next to each chunk is a JSON file
+    with the contracts of its reqIds.
+
+    The fsync policy is FSYNC_NEVER (leave it to the OS), FSYNC_ROTATE
+    (when a chunk is completed) or FSYNC_BATCH (after every batch).
+
+    At most maxBatches batches are in use; when the writer falls that
+    far behind, the ticks of a full batch are dropped and counted in
+    numDropped rather than waiting for the writer.
+    """
+    def __init__(self, client, directory, prefix='ticks', batchSize=4096,
+            flushInterval=1.0, chunkSize=64 * 1024 * 1024,
+            fsync=FSYNC_ROTATE, maxBatches=64):
+        if fsync not in (FSYNC_NEVER, FSYNC_ROTATE, FSYNC_BATCH):
+            raise ValueError('Unknown fsync policy {!r}'.format(fsync))
+        self.client = client
+        self.directory = directory
+        self.prefix = prefix
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.chunkSize = chunkSize
+        self.fsync = fsync
+        self.maxBatches = maxBatches
+        self.numTicks = 0
+        self.numDropped = 0
+        self.numBatches = 0
+        self._buf = None
+        self._n = 0
+        self._free = collections.deque()
+        self._numAllocated = 0
+        self._known = set()
+        self._newContracts = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._timer = None
+        # state of the writer thread
+        self._file = None
+        self._chunkBytes = 0
+        self._chunkSeq = 0
+        self._contracts = {}
+        self._contractsPath = None
+        self._logger = logging.getLogger(__class__.__name__)
+
+    def start(self):
+        """
+        Start the writer thread and attach to the client.
+        """
+        if self._thread:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._buf = self._newBatch()
+        self._thread = threading.Thread(target=self._writerLoop,
+                name='TickRecorder', daemon=True)
+        self._thread.start()
+        self.client.tickRecorder = self
+        self._scheduleFlush()
+        self._logger.info('Recording ticks to {}'.format(self.directory))
+
+    def stop(self):
+        """
+        Detach from the client, write the remaining ticks and wait
+        for the writer thread to finish.
+        """
+        if not self._thread:
+            return
+        if self.client.tickRecorder is self:
+            self.client.tickRecorder = None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def flush(self):
+        """
+        Hand the ticks of the current batch to the writer.
+        """
+        if self._n or self._newContracts:
+            self._handOff()
+
+    def rotate(self):
+        """
+        Start a new chunk with the next tick.
+        """
+        self.flush()
+        self._known.clear()
+        self._queue.put(_ROTATE)
+
+    def put(self, reqId, tickType, kind, value):
+        """
+        Add a tick of the given kind (PRICE, SIZE or GENERIC).
+        """
+        if reqId not in self._known:
+            self._addContract(reqId)
+        RECORD.pack_into(self._buf, self._n * RECORD.size, time.time(),
+                reqId, tickType, kind, value)
+        self._n += 1
+        self.numTicks += 1
+        if self._n == self.batchSize:
+            self._handOff()
+
+    def _newBatch(self):
+        self._numAllocated += 1
+        return bytearray(self.batchSize * RECORD.size)
+
+    def _addContract(self, reqId):
+        self._known.add(reqId)
+        sub = self.client._subscriptions.get(reqId)
+        contract = sub[1][0] if sub and sub[1] else None
+        self._newContracts[reqId] = None if contract is None else {
+                f: getattr(contract, f, '') for f in ('conId',) + keyFields}
+
+    def _handOff(self):
+        if self._free:
+            buf = self._free.popleft()
+        elif self._numAllocated < self.maxBatches:
+            buf = self._newBatch()
+        else:
+            # the writer is too far behind; reuse the current batch
+            self.numDropped += self._n
+            self._n = 0
+            return
+        self._queue.put((self._buf, self._n, self._newContracts))
+        self.numBatches += 1
+        self._buf = buf
+        self._n = 0
+        self._newContracts = {}
+
+    def _scheduleFlush(self):
+        self.flush()
+        self._timer = asyncio.get_event_loop().call_later(
+                self.flushInterval, self._scheduleFlush)
+
+    def _writerLoop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if item is _ROTATE:
+                    self._closeChunk()
+                    self._contracts = {}
+                    continue
+                buf, n, contracts = item
+                try:
+                    self._write(buf, n, contracts)
+                finally:
+                    self._free.append(buf)
+            except OSError:
+                self._logger.exception('Error writing ticks')
+                if self._file is not None:
+                    try:
+                        self._file.close()
+                    except OSError:
+                        # the file is closed even when its flush fails
+                        pass
+                    self._file = None
+        try:
+            self._closeChunk()
+        except OSError:
+            self._logger.exception('Error closing tick chunk')
+
+    def _write(self, buf, n, contracts):
+        if self._file is None:
+            self._openChunk()
+        if n:
+            size = n * RECORD.size
+            self._file.write(memoryview(buf)[:size])
+            self._chunkBytes += size
+        if contracts:
+            self._contracts.update(contracts)
+            self._writeContracts()
+        if self.fsync == FSYNC_BATCH:
+            os.fsync(self._file.fileno())
+        if self._chunkBytes >= self.chunkSize:
+            self._closeChunk()
+
+    def _openChunk(self):
+        self._chunkSeq += 1
+        name = '{}-{}-{:04d}'.format(self.prefix,
+                time.strftime('%Y%m%d-%H%M%S', time.gmtime()), self._chunkSeq)
+        path = os.path.join(self.directory, name + '.ticks')
+        self._file = open(path, 'ab', buffering=0)
+        self._file.write(HEADER.pack(MAGIC, RECORD.size))
+        self._chunkBytes = HEADER.size
+        self._contractsPath = os.path.join(self.directory, name + '.json')
+        if self._contracts:
+            self._writeContracts()
+
+    def _closeChunk(self):
+        if self._file is None:
+            return
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _writeContracts(self):
+        tmpPath = self._contractsPath + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(self._contracts, f)
+        os.replace(tmpPath, self._contractsPath)
+
+
+def tickChunks(directory, prefix='ticks') -> list:
+    """
+    Get the paths of the tick chunk files in the directory, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(directory, prefix + '-*.ticks')))
+
+
+def loadTicks(path):
+    """
+    Read a tick chunk file as written by the TickRecorder and return
+    (ticks, contracts), where contracts is a dict from reqId to a dict
+    of contract fields.
+
+    With NumPy the ticks are a memory-mapped structured array with the
+    fields time, reqId, tickType, kind, pad and value; else they are a
+    list of (time, reqId, tickType, kind, value) tuples. A partial record
+    at the end, from a chunk that is still being written or from a crash,
+    is left out.
+    """
+    from .barstore import np
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, recordSize = HEADER.unpack_from(mm)
+    if magic != MAGIC or recordSize != RECORD.size:
+        raise ValueError('{} is not a tick chunk file'.format(path))
+    n = (len(mm) - HEADER.size) // RECORD.size
+    if np is not None:
+        ticks = np.frombuffer(mm, dtype=DTYPE, count=n, offset=HEADER.size)
+    else:
+        end = HEADER.size + n * RECORD.size
+        ticks = list(RECORD.iter_unpack(mm[HEADER.size:end]))
+    contracts = {}
+    contractsPath = os.path.splitext(path)[0] + '.json'
+    if os.path.exists(contractsPath):
+        with open(contractsPath) as f:
+            contracts = {int(k): v for k, v in json.load(f).items()}
+    return ticks, contracts
@@ -0,0 +1,157 @@
+import time
+import asyncio
+import collections
+
+__all__ = ['TickStream', 'DROP_OLDEST', 'CONFLATE', 'BLOCK']
+
+# overflow policies
+DROP_OLDEST = 'dropOldest'
+CONFLATE = 'conflate'
+BLOCK = 'block'
+
+
+class TickStream:
+    """
+    Ticks of one market data subscription in a ring buffer of fixed
+    capacity, to be consumed with ``async for tick in stream`` or in
+    batches with popAll. A tick is a (time, tickType, value) tuple.
+
+    When the buffer is full, the policy decides what happens to a new
+    tick:
+
+    * DROP_OLDEST: the oldest tick is dropped;
+    * CONFLATE: the new tick replaces the pending tick of the same tick
+      type, or else the oldest tick is dropped;
+    * BLOCK: reading from the socket is paused until the buffer is half
+      empty again. The ticks of the read that filled the buffer are
+      kept, so it can exceed its capacity by that much. With a decode
+      worker the client stops draining the events of the worker
+      instead, which stops reading the socket when its event ring is
+      full; the buffer can then exceed its capacity by the ticks of
+      one drained batch (the workerBatchSize of the client).
+
+    Dropped and replaced ticks are counted in numDropped and the pauses
+    in numPaused.
+    """
+    def __init__(self, reqId, contract, capacity=1024, policy=DROP_OLDEST,
+            pause=None, resume=None):
+        if policy not in (DROP_OLDEST, CONFLATE, BLOCK):
+            raise ValueError('Unknown policy {!r}'.format(policy))
+        self.reqId = reqId
+        self.contract = contract
+        self.capacity = capacity
+        self.policy = policy
+        self.numDropped = 0
+        self.numPaused = 0
+        self._pause = pause
+        self._resume = resume
+        self._paused = False
+        self._buf = [None] * capacity
+        self._head = 0  # sequence number of the oldest tick
+        self._tail = 0  # sequence number of the next tick
+        self._latest = {}  # tickType -> sequence number of latest tick
+        self._overflow = collections.deque()
+        self._waiter = None
+        self._exc = None
+        self._done = False
+
+    def __repr__(self):
+        return '<TickStream {} {}/{} dropped={}>'.format(
+                getattr(self.contract, 'symbol', self.reqId),
+                len(self), self.capacity, self.numDropped)
+
+    def __len__(self):
+        """
+        Number of ticks that are waiting to be consumed.
+        """
+        return self._tail - self._head + len(self._overflow)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self._head == self._tail:
+            if self._done:
+                if self._exc:
+                    raise self._exc
+                raise StopAsyncIteration
+            self._waiter = asyncio.Future()
+            await self._waiter
+        return self._pop()
+
+    def put(self, tickType, value):
+        """
+        Add a new tick, applying the policy when the buffer is full.
+        """
+        tick = (time.time(), tickType, value)
+        capacity = self.capacity
+        if self._tail - self._head == capacity:
+            self._overflowed(tick)
+        else:
+            self._buf[self._tail % capacity] = tick
+            self._latest[tickType] = self._tail
+            self._tail += 1
+        if self._waiter:
+            if not self._waiter.done():
+                self._waiter.set_result(None)
+            self._waiter = None
+
+    def popAll(self) -> list:
+        """
+        Remove and return all waiting ticks, oldest first.
+        """
+        ticks = []
+        while self._head != self._tail:
+            ticks.append(self._pop())
+        return ticks
+
+    def end(self, exc=None):
+        """
+        End the iteration once the waiting ticks are consumed,
+        with the exception if given.
+        """
+        self._done = True
+        self._exc = exc
+        self._overflow.clear()
+        if self._paused:
+            self._paused = False
+            self._resume(self)
+        if self._waiter and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _overflowed(self, tick):
+        if self.policy == BLOCK:
+            self._overflow.append(tick)
+            if not self._paused and self._pause:
+                self._paused = True
+                self.numPaused += 1
+                self._pause(self)
+            return
+        self.numDropped += 1
+        capacity = self.capacity
+        if self.policy == CONFLATE:
+            seq = self._latest.get(tick[1])
+            if seq is not None and seq >= self._head:
+                self._buf[seq % capacity] = tick
+                return
+        # drop the oldest
+        self._head += 1
+        self._buf[self._tail % capacity] = tick
+        self._latest[tick[1]] = self._tail
+        self._tail += 1
+
+    def _pop(self):
+        capacity = self.capacity
+        i = self._head % capacity
+        tick = self._buf[i]
+        self._buf[i] = None
+        self._head += 1
+        if self._overflow:
+            tick2 = self._overflow.popleft()
+            self._buf[self._tail % capacity] = tick2
+            self._latest[tick2[1]] = self._tail
+            self._tail += 1
+        elif self._paused and len(self) <= capacity // 2:
+            self._paused = False
+            self._resume(self)
+        return tick
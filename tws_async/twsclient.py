@@ -1,3 +1,6 @@
+import os
+import time
+import socket
 import struct
 import asyncio
 import logging
@@ -5,58 +8,170 @@ import logging
 import ibapi
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper, iswrapper
+from ibapi.execution import ExecutionFilter
+from ibapi.common import TickAttrib
+from ibapi.scanner import ScanData
+from ibapi.errors import NOT_CONNECTED
 
 import tws_async.util as util
+from .framer import Framer
+from .fastdecoder import FastDecoder
+from .ticker import Ticker
+from .tickstream import TickStream, DROP_OLDEST
+from .tickrecorder import TickRecorder, PRICE, SIZE, GENERIC
+from .sendqueue import SendQueue
+from .metrics import Metrics
 
-__all__ = ['TWSClient', 'TWSException', 'iswrapper']
+__all__ = ['TWSClient', 'TWSException', 'ConnectionLostError', 'iswrapper']
+
+
+# errors that are notices, after which a subscription continues
+_noticeCodes = {10167, 10197}
+
+
+def isWarning(errorCode) -> bool:
+    """
+    See if the error code is a warning or notice, which does not end
+    the request or subscription that it is for.
+    """
+    return 2100 <= errorCode < 2200 or errorCode in _noticeCodes
 
 
 class TWSException(Exception):
+    """
+    Error reported by the server, with the errorCode if it was given.
+    """
+    def __init__(self, message='', errorCode=None):
+        Exception.__init__(self, message)
+        self.errorCode = errorCode
+
+
+class ConnectionLostError(TWSException):
+    """
+    The connection was lost while the request was outstanding,
+    and it could not be replayed.
+    """
     pass
 
 
+class Request:
+    """
+    Request that is waiting for its end callback.
+
+    The send function takes the reqId and sends the request; it is called
+    again with a new reqId when the request is replayed after a reconnect.
+    The cancel function takes the reqId and cancels the request at
+    the server.
+    """
+    __slots__ = ('reqId', 'future', 'data', 'send', 'cancel', 'timer',
+            'startTime')
+
+    def __init__(self, reqId, future, data, send, cancel):
+        self.reqId = reqId
+        self.future = future
+        self.data = data
+        self.send = send
+        self.cancel = cancel
+        self.timer = None
+        self.startTime = time.time()
+
+
 class TWSClient(EWrapper, EClient):
     """
     Modification of EClient that uses the event loop from asyncio.
     """
     def __init__(self):
         self.readyEvent = asyncio.Event()
+        self._framer = Framer()
+        # decode hot market data messages with the FastDecoder
+        self.fastDecoder = False
+        # ceiling on the rate of messages sent to the server
+        self.maxMsgsPerSec = 45
+        # low-latency transport: TCP_NODELAY and reading directly
+        # into the framer
+        self.lowLatency = False
+        # size of the socket receive buffer, 0 for the system default
+        self.recvBufferSize = 0
+        # read and decode the socket in a separate process (POSIX only)
+        self.decodeWorker = False
+        # maximum number of worker events handled in one go
+        self.workerBatchSize = 1000
+        self._worker = None
+        self._tickers = {}
+        self._updatedTickers = set()
+        self._tickStreams = {}
+        self._pausedStreams = set()
+        self._requests = {}
+        # reqId -> (request method name, args, kwargs) of subscriptions
+        self._subscriptions = {}
+        # reconnect with exponential backoff after the connection is lost
+        self.autoReconnect = False
+        self.reconnectDelay = 0.1
+        self.maxReconnectDelay = 30
+        self.maxReconnectAttempts = 20
+        self._reconnectTask = None
+        # Metrics when enabled, else None
+        self.metrics = None
+        # TickRecorder while recording, else None
+        self.tickRecorder = None
         EClient.__init__(self, wrapper=self)
         self._logger = logging.getLogger(__class__.__name__)
 
     def reset(self):
         EClient.reset(self)
         self.readyEvent.clear()
-        self._data = b''
+        self._framer.reset()
         self._reqIdSeq = 0
 
     def run(self, coro=None):
         """
         Per default run the asyncio event loop forever.
-        If a coroutine is given then run it until completion.
+        If a coroutine is given then run it until completion
+        and return its result.
         """
         loop = asyncio.get_event_loop()
         if coro is None:
             loop.run_forever()
         else:
-            loop.run_until_complete(coro)
+            return loop.run_until_complete(coro)
 
     def connect(self, host, port, clientId, asyncConnect=False):
+        connect_future = self._connect(host, port, clientId)
+        if not asyncConnect:
+            loop = asyncio.get_event_loop()
+            loop.run_until_complete(asyncio.gather(connect_future,
+                    self.readyEvent.wait()))
+
+    def _connect(self, host, port, clientId) -> asyncio.Future:
         self._logger.info('Connecting to {}:{} with clientId {}...'.
                 format(host, port, clientId))
         self.host = host
         self.port = port
         self.clientId = clientId
         self.setConnState(EClient.CONNECTING)
-        self.conn = TWSConnection(host, port)
+        self.conn = TWSConnection(host, port, self.maxMsgsPerSec,
+                self.lowLatency, self.recvBufferSize, self._framer)
         self.conn.connected = self._onSocketConnected
         self.conn.connectionLost = self._onSocketConnectionLost
         self.conn.hasData = self._onSocketHasData
-        connect_future = self.conn.connect()
-        if not asyncConnect:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(asyncio.gather(connect_future,
-                    self.readyEvent.wait()))
+        return self.conn.connect()
+
+    def disconnect(self):
+        """
+        Disconnect from the server, without reconnecting. Outstanding
+        requests fail with a ConnectionLostError.
+        """
+        if self._reconnectTask:
+            self._reconnectTask.cancel()
+            self._reconnectTask = None
+        self._failRequests(lambda req: True, 'Disconnected')
+        self._endTickStreams('Disconnected')
+        if self._worker and self.conn:
+            # the worker shuts the socket down when stopped, so write
+            # the queued messages first
+            self.conn.sendQueue.writeAll()
+        self._stopDecodeWorker()
+        EClient.disconnect(self)
 
     def getReqId(self) -> int:
         """
@@ -67,11 +182,451 @@ class TWSClient(EWrapper, EClient):
         self._reqIdSeq += 1
         return newId
 
+    def enableMetrics(self, loopLagInterval=0.1) -> Metrics:
+        """
+        Start collecting metrics of the message handling and sample
+        the event loop lag every loopLagInterval seconds (0 to not
+        sample). Read them with client.metrics.snapshot().
+        """
+        self.disableMetrics()
+        self.metrics = Metrics(self, asyncio.get_event_loop().call_later,
+                loopLagInterval)
+        return self.metrics
+
+    def disableMetrics(self):
+        if self.metrics:
+            self.metrics.stop()
+            self.metrics = None
+
+    def startTickRecorder(self, directory, **kwargs) -> TickRecorder:
+        """
+        Start recording the numeric ticks to chunk files in the
+        directory; see TickRecorder for the options.
+        """
+        self.stopTickRecorder()
+        recorder = TickRecorder(self, directory, **kwargs)
+        recorder.start()
+        return recorder
+
+    def stopTickRecorder(self):
+        if self.tickRecorder:
+            self.tickRecorder.stop()
+
+    def reqTicker(self, contract, genericTickList='') -> Ticker:
+        """
+        Subscribe to market data of the contract and return the Ticker
+        that is kept up to date with it.
+        """
+        reqId = self.getReqId()
+        ticker = Ticker(reqId, contract)
+        self._tickers[reqId] = ticker
+        self.reqMktData(reqId, contract, genericTickList, False, False, [])
+        return ticker
+
+    def cancelTicker(self, ticker: Ticker):
+        """
+        Unsubscribe from the market data of the ticker.
+        """
+        if self._tickers.pop(ticker.reqId, None):
+            self.cancelMktData(ticker.reqId)
+        self._updatedTickers.discard(ticker)
+
+    def reqTickStream(self, contract, genericTickList='', capacity=1024,
+            policy=DROP_OLDEST) -> TickStream:
+        """
+        Subscribe to the market data of the contract and return a
+        TickStream with a buffer of the given capacity and overflow
+        policy, that gets the ticks of the subscription.
+        """
+        reqId = self.getReqId()
+        stream = TickStream(reqId, contract, capacity, policy,
+                self._pauseStream, self._resumeStream)
+        self._tickStreams[reqId] = stream
+        self.reqMktData(reqId, contract, genericTickList, False, False, [])
+        return stream
+
+    def cancelTickStream(self, stream: TickStream):
+        """
+        Unsubscribe from the market data of the stream and end it.
+        """
+        if self._tickStreams.pop(stream.reqId, None) is not None:
+            self.cancelMktData(stream.reqId)
+        stream.end()
+
+    def _endTickStreams(self, message):
+        # the subscriptions are gone for good
+        streams = list(self._tickStreams.values())
+        self._tickStreams.clear()
+        for stream in streams:
+            stream.end(ConnectionLostError(message))
+
+    def _pauseStream(self, stream):
+        # stop reading from the socket while the stream is full;
+        # a decode worker is paused by no longer draining its ring,
+        # so that it stops reading the socket once the ring is full
+        self._pausedStreams.add(stream)
+        if len(self._pausedStreams) != 1:
+            return
+        if self._worker:
+            asyncio.get_event_loop().remove_reader(self._worker.notifyFileno)
+        elif self.conn and self.conn.socket:
+            self.conn.socket.transport.pause_reading()
+
+    def _resumeStream(self, stream):
+        if stream not in self._pausedStreams:
+            return
+        self._pausedStreams.discard(stream)
+        if self._pausedStreams:
+            return
+        if self._worker:
+            loop = asyncio.get_event_loop()
+            loop.add_reader(self._worker.notifyFileno, self._onWorkerEvents)
+            loop.call_soon(self._onWorkerEvents)
+        elif self.conn and self.conn.socket:
+            self.conn.socket.transport.resume_reading()
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot,
+            regulatorySnapshot, mktDataOptions):
+        args = (contract, genericTickList, snapshot, regulatorySnapshot,
+                mktDataOptions)
+        if snapshot or regulatorySnapshot:
+            # a snapshot ends by itself and is not renewed
+            EClient.reqMktData(self, reqId, *args)
+        else:
+            self._subscribe('reqMktData', reqId, args, {})
+
+    def cancelMktData(self, reqId):
+        self._unsubscribe('cancelMktData', reqId)
+
+    def reqRealTimeBars(self, reqId, *args, **kwargs):
+        self._subscribe('reqRealTimeBars', reqId, args, kwargs)
+
+    def cancelRealTimeBars(self, reqId):
+        self._unsubscribe('cancelRealTimeBars', reqId)
+
+    def reqMktDepth(self, reqId, *args, **kwargs):
+        self._subscribe('reqMktDepth', reqId, args, kwargs)
+
+    def cancelMktDepth(self, reqId, *args, **kwargs):
+        self._unsubscribe('cancelMktDepth', reqId, *args, **kwargs)
+
+    def _subscribe(self, methodName, reqId, args, kwargs):
+        # register the subscription, to renew it after a reconnect
+        self._subscriptions[reqId] = (methodName, args, kwargs)
+        getattr(EClient, methodName)(self, reqId, *args, **kwargs)
+
+    def _unsubscribe(self, methodName, reqId, *args, **kwargs):
+        self._subscriptions.pop(reqId, None)
+        getattr(EClient, methodName)(self, reqId, *args, **kwargs)
+
+    def _dropSubscription(self, reqId, exc):
+        # the server rejected or ended the subscription
+        self._subscriptions.pop(reqId, None)
+        ticker = self._tickers.pop(reqId, None)
+        if ticker:
+            self._updatedTickers.discard(ticker)
+        stream = self._tickStreams.pop(reqId, None)
+        if stream is not None:
+            stream.end(exc)
+
+    def reqIdsRemapped(self, reqIds: dict):
+        """
+        Called after a reconnect with the dict of old to new reqIds of the
+        subscriptions and requests that have been replayed.
+        """
+        pass
+
+    async def contractDetailsAsync(self, contract, timeout=None) -> list:
+        """
+        Get the list of ContractDetails that match the contract.
+        """
+        await self.readyEvent.wait()
+        return await self._startRequest(
+                lambda reqId: self.reqContractDetails(reqId, contract),
+                timeout=timeout)
+
+    async def executionsAsync(self, execFilter=None, timeout=None) -> list:
+        """
+        Get the list of (contract, execution) tuples of the executions
+        that pass the filter.
+        """
+        await self.readyEvent.wait()
+        execFilter = execFilter or ExecutionFilter()
+        return await self._startRequest(
+                lambda reqId: self.reqExecutions(reqId, execFilter),
+                timeout=timeout)
+
+    async def scannerDataAsync(self, subscription, options=None,
+            filterOptions=None, timeout=None) -> list:
+        """
+        Get the list of ScanData of one scan. The scanner subscription
+        is cancelled after the scan.
+        """
+        await self.readyEvent.wait()
+        return await self._startRequest(
+                lambda reqId: self.reqScannerSubscription(reqId,
+                    subscription, options or [], filterOptions or []),
+                timeout=timeout, cancel=self.cancelScannerSubscription)
+
+    def _startRequest(self, send, data=None, timeout=None, cancel=None) \
+            -> asyncio.Future:
+        """
+        Send a request with a new reqId and return the future of its result.
+
+        The send and cancel functions take the reqId; send sends the
+        request and is called again, with a new reqId, to replay the
+        request after a reconnect. The cancel function, if given, is called
+        to cancel the request at the server when the future times out
+        or is cancelled.
+
+        Results that arrive before the end callback are collected in data,
+        a list per default. On a timeout (in seconds) the future gets an
+        asyncio.TimeoutError.
+        """
+        reqId = self.getReqId()
+        req = Request(reqId, asyncio.Future(),
+                [] if data is None else data, send, cancel)
+        if timeout:
+            req.timer = asyncio.get_event_loop().call_later(timeout,
+                    self._timeoutRequest, req)
+        self._requests[reqId] = req
+        req.future.add_done_callback(lambda fut: self._onRequestDone(req))
+        send(reqId)
+        return req.future
+
+    def _requestData(self, reqId):
+        """
+        Get the data of the active request, or None if there is none.
+        """
+        req = self._requests.get(reqId)
+        return req.data if req else None
+
+    def _addResult(self, reqId, item):
+        req = self._requests.get(reqId)
+        if req:
+            req.data.append(item)
+
+    def _popRequest(self, reqId):
+        req = self._requests.pop(reqId, None)
+        if req and req.timer:
+            req.timer.cancel()
+        return req
+
+    def _endRequest(self, reqId, result=None):
+        """
+        Resolve the request with the result, or with its data if
+        no result is given.
+        """
+        req = self._popRequest(reqId)
+        if req and not req.future.done():
+            req.future.set_result(req.data if result is None else result)
+
+    def _failRequest(self, reqId, exc):
+        req = self._popRequest(reqId)
+        if req and not req.future.done():
+            req.future.set_exception(exc)
+
+    def _failRequests(self, predicate, message):
+        # fail the requests for which the predicate holds
+        for req in list(self._requests.values()):
+            if predicate(req):
+                self._failRequest(req.reqId, ConnectionLostError(message))
+
+    def _cancelRequest(self, reqId):
+        # cancel the request at the server
+        req = self._requests.get(reqId)
+        if req and req.cancel and self.isConnected():
+            req.cancel(reqId)
+
+    def _timeoutRequest(self, req):
+        if self._requests.get(req.reqId) is req:
+            self._cancelRequest(req.reqId)
+            self._failRequest(req.reqId, asyncio.TimeoutError())
+
+    def _onRequestDone(self, req):
+        if self._requests.get(req.reqId) is req:
+            # the future is cancelled by the awaiting task
+            self._cancelRequest(req.reqId)
+            self._popRequest(req.reqId)
+
+    def _replay(self):
+        """
+        Renew the subscriptions and resend the outstanding requests,
+        with new reqIds, after a reconnect.
+        """
+        reqIds = {}
+        subscriptions = self._subscriptions
+        self._subscriptions = {}
+        for oldId, (methodName, args, kwargs) in subscriptions.items():
+            reqIds[oldId] = newId = self.getReqId()
+            getattr(self, methodName)(newId, *args, **kwargs)
+        if self.tickRecorder:
+            # the recorded reqIds of a chunk must stay unique
+            self.tickRecorder.rotate()
+        for registry in (self._tickers, self._tickStreams):
+            # tickers and tick streams move to the new reqIds
+            items = list(registry.values())
+            registry.clear()
+            for item in items:
+                item.reqId = reqIds.get(item.reqId, item.reqId)
+                registry[item.reqId] = item
+        requests = self._requests
+        self._requests = {}
+        for oldId, req in requests.items():
+            reqIds[oldId] = req.reqId = self.getReqId()
+            self._requests[req.reqId] = req
+            if isinstance(req.data, list):
+                del req.data[:]
+            req.send(req.reqId)
+        self._logger.info('Replayed {} subscriptions and {} requests'.format(
+                len(subscriptions), len(requests)))
+        self.reqIdsRemapped(reqIds)
+
+    async def _reconnect(self, host, port, clientId):
+        delay = self.reconnectDelay
+        for attempt in range(self.maxReconnectAttempts):
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, self.maxReconnectDelay)
+            try:
+                await self._connect(host, port, clientId)
+                await asyncio.wait_for(self.readyEvent.wait(), 10)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._logger.info('Reconnect attempt {} failed: {!r}'.format(
+                        attempt + 1, e))
+                if self.conn and self.conn.isConnected():
+                    self.conn.disconnect()
+                self.reset()
+                continue
+            self._reconnectTask = None
+            self._replay()
+            return
+        self._reconnectTask = None
+        self._logger.error('Giving up reconnecting')
+        self._failRequests(lambda req: True, 'Connection lost')
+        self._endTickStreams('Connection lost')
+
+    def tickersUpdated(self, tickers: list):
+        """
+        Called with the list of tickers that were updated during
+        one read from the socket.
+        """
+        pass
+
     def dataHandlingPre(self):
         pass
 
     def dataHandlingPost(self):
-        pass
+        """
+        Called after each read from the socket. Subclasses that override
+        it must call this method to get the tickersUpdated notifications.
+        """
+        if self._updatedTickers:
+            tickers = list(self._updatedTickers)
+            self._updatedTickers.clear()
+            now = time.time()
+            for ticker in tickers:
+                ticker.time = now
+            self.tickersUpdated(tickers)
+
+    @iswrapper
+    def tickPrice(self, reqId, tickType, price, attrib):
+        ticker = self._tickers.get(reqId)
+        if ticker:
+            ticker.update(tickType, price)
+            self._updatedTickers.add(ticker)
+        stream = self._tickStreams.get(reqId)
+        if stream is not None:
+            stream.put(tickType, price)
+        recorder = self.tickRecorder
+        if recorder is not None:
+            recorder.put(reqId, tickType, PRICE, price)
+
+    @iswrapper
+    def tickSize(self, reqId, tickType, size):
+        ticker = self._tickers.get(reqId)
+        if ticker:
+            ticker.update(tickType, size)
+            self._updatedTickers.add(ticker)
+        stream = self._tickStreams.get(reqId)
+        if stream is not None:
+            stream.put(tickType, size)
+        recorder = self.tickRecorder
+        if recorder is not None:
+            recorder.put(reqId, tickType, SIZE, size)
+
+    @iswrapper
+    def tickGeneric(self, reqId, tickType, value):
+        ticker = self._tickers.get(reqId)
+        if ticker:
+            ticker.update(tickType, value)
+            self._updatedTickers.add(ticker)
+        stream = self._tickStreams.get(reqId)
+        if stream is not None:
+            stream.put(tickType, value)
+        recorder = self.tickRecorder
+        if recorder is not None:
+            recorder.put(reqId, tickType, GENERIC, value)
+
+    @iswrapper
+    def tickString(self, reqId, tickType, value):
+        stream = self._tickStreams.get(reqId)
+        if stream is not None:
+            stream.put(tickType, value)
+
+    @iswrapper
+    def contractDetails(self, reqId, contractDetails):
+        self._addResult(reqId, contractDetails)
+
+    @iswrapper
+    def bondContractDetails(self, reqId, contractDetails):
+        self._addResult(reqId, contractDetails)
+
+    @iswrapper
+    def contractDetailsEnd(self, reqId):
+        self._endRequest(reqId)
+
+    @iswrapper
+    def execDetails(self, reqId, contract, execution):
+        self._addResult(reqId, (contract, execution))
+
+    @iswrapper
+    def execDetailsEnd(self, reqId):
+        self._endRequest(reqId)
+
+    @iswrapper
+    def scannerData(self, reqId, rank, contractDetails, distance,
+            benchmark, projection, legsStr):
+        self._addResult(reqId, ScanData(contractDetails.contract, rank,
+                distance, benchmark, projection, legsStr))
+
+    @iswrapper
+    def scannerDataEnd(self, reqId):
+        self._cancelRequest(reqId)
+        self._endRequest(reqId)
+
+    @iswrapper
+    def error(self, reqId, errorCode, errorString):
+        """
+        Errors for an active request end that request with a TWSException;
+        errors for a subscription end it, together with its ticker or tick
+        stream. All other errors and warnings are logged. Subclasses that
+        override it must call this method.
+        """
+        if isWarning(errorCode):
+            EWrapper.error(self, reqId, errorCode, errorString)
+        elif reqId in self._requests:
+            self._failRequest(reqId, TWSException(errorString, errorCode))
+        else:
+            if reqId in self._subscriptions and \
+                    errorCode != NOT_CONNECTED.code():
+                # (one made while not connected is renewed on reconnect)
+                self._dropSubscription(reqId,
+                        TWSException(errorString, errorCode))
+            EWrapper.error(self, reqId, errorCode, errorString)
+
+    @iswrapper
+    def tickSnapshotEnd(self, reqId):
+        self._subscriptions.pop(reqId, None)
 
     def _prefix(self, msg):
         # prefix a message with its length
@@ -85,79 +640,217 @@ class TWSClient(EWrapper, EClient):
                 ibapi.server_versions.MIN_CLIENT_VER,
                 ibapi.server_versions.MAX_CLIENT_VER))
         self.conn.sendMsg(msg)
-        self.decoder = ibapi.decoder.Decoder(self.wrapper, None)
+        decoderClass = FastDecoder if self.fastDecoder \
+                else ibapi.decoder.Decoder
+        self.decoder = decoderClass(self.wrapper, None)
 
     def _onSocketConnectionLost(self):
+        if self.connState != EClient.CONNECTED:
+            # disconnected on purpose or during a reconnect attempt
+            return
         self._logger.error('Connection lost')
+        self._stopDecodeWorker()
+        host, port, clientId = self.host, self.port, self.clientId
+        self.conn.sendQueue.clear()
+        self.conn.socket = None
+        self.reset()
+        self.wrapper.connectionClosed()
+        if self.autoReconnect:
+            self._failRequests(lambda req: not req.send, 'Connection lost')
+            self._reconnectTask = asyncio.ensure_future(
+                    self._reconnect(host, port, clientId))
+        else:
+            self._failRequests(lambda req: True, 'Connection lost')
+            self._endTickStreams('Connection lost')
 
     def _onSocketHasData(self, data):
+        # data is None when it was read into the framer already
         self.dataHandlingPre()
-        self._data += data
-
-        while True:
-            if len(self._data) <= 4:
-                break
-            # 4 byte prefix tells the message length
-            msgEnd = 4 + struct.unpack('>I', self._data[:4])[0]
-            if len(self._data) < msgEnd:
-                # insufficient data for now
-                break
-            msg = self._data[4:msgEnd]
-            self._data = self._data[msgEnd:]
-            fields = msg.split(b'\0')
-            fields.pop()  # pop off last empty element
-
-            if not self.serverVersion_ and len(fields) == 2:
-                # this concludes the handshake
-                version, self.connTime = fields
-                self.serverVersion_ = int(version)
-                self.decoder.serverVersion = self.serverVersion_
-                self.setConnState(EClient.CONNECTED)
-                self.startApi()
-                self.wrapper.connectAck()
-                self._logger.info('Logged on to server version {}'.
-                        format(self.serverVersion_))
-            else:
-                # snoop for next valid id response,
-                # it signals readiness of the client
-                if fields[0] == b'9':
-                    _, _, validId = fields
-                    self._reqIdSeq = int(validId)
-                    self.readyEvent.set()
-
-                # decode and handle the message
-                self.decoder.interpret(fields)
+        if data is not None:
+            self._framer.feed(data)
+
+        metrics = self.metrics
+        if metrics is None:
+            for msg in self._framer.frames():
+                fields = msg.split(b'\0')
+                fields.pop()  # pop off last empty element
+                self._handleFields(fields)
+        else:
+            numBytes = len(self._framer)
+            msgs = self._framer.frames()
+            metrics.addRead(len(msgs), numBytes)
+            for msg in msgs:
+                t0 = time.perf_counter()
+                fields = msg.split(b'\0')
+                fields.pop()
+                self._handleFields(fields)
+                metrics.addMessage(fields[0], len(msg),
+                        time.perf_counter() - t0)
 
         self.dataHandlingPost()
 
+        if self.decodeWorker and not self._worker and \
+                self.readyEvent.is_set():
+            self._startDecodeWorker()
+
+    def _handleFields(self, fields):
+        if not self.serverVersion_ and len(fields) == 2:
+            # this concludes the handshake
+            version, self.connTime = fields
+            self.serverVersion_ = int(version)
+            self.decoder.serverVersion = self.serverVersion_
+            self.setConnState(EClient.CONNECTED)
+            self.startApi()
+            self.wrapper.connectAck()
+            self._logger.info('Logged on to server version {}'.
+                    format(self.serverVersion_))
+        else:
+            # snoop for next valid id response,
+            # it signals readiness of the client
+            if fields[0] == b'9':
+                _, _, validId = fields
+                self._reqIdSeq = int(validId)
+                self.readyEvent.set()
+
+            # decode and handle the message
+            self.decoder.interpret(fields)
+
+    def _startDecodeWorker(self):
+        # hand the reading of the socket over to the worker process,
+        # together with the unread bytes of a partial message
+        from . import decodeworker
+        transport = self.conn.socket.transport
+        transport.pause_reading()
+        sock = transport.get_extra_info('socket')
+        workerSock = socket.socket(sock.family, sock.type, sock.proto,
+                os.dup(sock.fileno()))
+        self._worker = decodeworker.DecodeWorker(workerSock,
+                self.serverVersion_, self._framer.takeUnread())
+        if not self._pausedStreams:
+            asyncio.get_event_loop().add_reader(self._worker.notifyFileno,
+                    self._onWorkerEvents)
+        self._logger.info('Started decode worker')
+
+    def _stopDecodeWorker(self):
+        if self._worker:
+            asyncio.get_event_loop().remove_reader(self._worker.notifyFileno)
+            self._worker.stop()
+            self._worker = None
+
+    def _onWorkerEvents(self):
+        from . import decodeworker
+        worker = self._worker
+        if not worker:
+            return
+        wrapper = self.wrapper
+        closed = False
+        self.dataHandlingPre()
+        records = worker.drain(self.workerBatchSize)
+        if self.metrics is not None:
+            # the decoding itself is done and timed in the worker
+            self.metrics.addRead(len(records), 0)
+        for kind, value in records:
+            if kind == decodeworker.TICK_PRICE:
+                reqId, tickType, price, attribs = value
+                attrib = TickAttrib()
+                attrib.canAutoExecute = bool(attribs & 1)
+                attrib.pastLimit = bool(attribs & 2)
+                if attribs & 4:
+                    attrib.preOpen = True
+                wrapper.tickPrice(reqId, tickType, price, attrib)
+            elif kind == decodeworker.TICK_SIZE:
+                wrapper.tickSize(*value)
+            elif kind == decodeworker.TICK_GENERIC:
+                wrapper.tickGeneric(*value)
+            elif kind == decodeworker.RAW:
+                fields = value.split(b'\0')
+                fields.pop()
+                self._handleFields(fields)
+            elif kind == decodeworker.CLOSED:
+                closed = True
+        self.dataHandlingPost()
+        if not closed and worker is self._worker and worker.pending() \
+                and not self._pausedStreams:
+            # give other tasks a turn before handling the rest
+            asyncio.get_event_loop().call_soon(self._onWorkerEvents)
+        if closed and self.conn and self.conn.socket:
+            # the server closed the connection
+            self._stopDecodeWorker()
+            self.conn.socket.transport.close()
+
 
 class TWSConnection:
     """
     Replacement for ibapi.connection.Connection that uses asyncio.
+
+    In low-latency mode TCP_NODELAY is set and, where asyncio supports
+    it (Python 3.7+), the socket is read directly into the buffer of the
+    framer; hasData is then called with None. A non-zero recvBufferSize
+    sets the size of the socket receive buffer before connecting.
     """
-    def __init__(self, host, port):
+    def __init__(self, host, port, maxMsgsPerSec=45, lowLatency=False,
+            recvBufferSize=0, framer=None):
         self.host = host
         self.port = port
+        self.lowLatency = lowLatency
+        self.recvBufferSize = recvBufferSize
+        self.framer = framer
         self.wrapper = None
         self.socket = None
+        self.sendQueue = SendQueue(self._write,
+                asyncio.get_event_loop().call_later, maxMsgsPerSec)
         # the following are callbacks for socket events
         self.hasData = None
         self.connected = None
         self.connectionLost = None
+        self._logger = logging.getLogger(__class__.__name__)
 
     def _onConnectionCreated(self, future):
-        _, self.socket = future.result()
+        if future.cancelled():
+            return
+        if future.exception():
+            self._logger.error('Connection to {}:{} failed: {!r}'.format(
+                    self.host, self.port, future.exception()))
+            return
+        transport, self.socket = future.result()
+        sock = transport.get_extra_info('socket')
+        if self.lowLatency and sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.connected()
 
     def connect(self) -> asyncio.Future:
-        loop = asyncio.get_event_loop()
-        coro = loop.create_connection(lambda: TWSSocket(self),
-                self.host, self.port)
-        future = asyncio.ensure_future(coro)
+        future = asyncio.ensure_future(self._createConnection())
         future.add_done_callback(self._onConnectionCreated)
         return future
 
+    async def _createConnection(self):
+        loop = asyncio.get_event_loop()
+        if self.lowLatency and self.framer is not None \
+                and TWSBufferedSocket:
+            factory = lambda: TWSBufferedSocket(self, self.framer)
+        else:
+            factory = lambda: TWSSocket(self)
+        if not self.recvBufferSize:
+            return await loop.create_connection(factory, self.host, self.port)
+        # the receive buffer size must be set before connecting
+        # for it to be taken into account by the TCP window
+        infos = await loop.getaddrinfo(self.host, self.port,
+                type=socket.SOCK_STREAM)
+        family, type_, proto, _, address = infos[0]
+        sock = socket.socket(family, type_, proto)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                self.recvBufferSize)
+        try:
+            await loop.sock_connect(sock, address)
+        except BaseException:
+            sock.close()
+            raise
+        return await loop.create_connection(factory, sock=sock)
+
     def disconnect(self):
+        # messages sent just before disconnecting still go out
+        self.sendQueue.writeAll()
         self.socket.transport.close()
         self.socket = None
 
@@ -165,7 +858,11 @@ class TWSConnection:
         return self.socket is not None
 
     def sendMsg(self, msg):
-        self.socket.transport.write(msg)
+        self.sendQueue.put(msg)
+
+    def _write(self, data):
+        if self.socket:
+            self.socket.transport.write(data)
 
 
 class TWSSocket(asyncio.Protocol):
@@ -184,6 +881,35 @@ class TWSSocket(asyncio.Protocol):
         self.twsConnection.hasData(data)
 
 
+if hasattr(asyncio, 'BufferedProtocol'):
+
+    class TWSBufferedSocket(asyncio.BufferedProtocol):
+        """
+        Socket protocol that reads directly into the buffer of the framer.
+        """
+        readSize = 65536
+
+        def __init__(self, twsConnection, framer):
+            self.transport = None
+            self.twsConnection = twsConnection
+            self.framer = framer
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def connection_lost(self, exc):
+            self.twsConnection.connectionLost()
+
+        def get_buffer(self, sizehint):
+            return self.framer.getBuffer(max(sizehint, self.readSize))
+
+        def buffer_updated(self, nbytes):
+            self.framer.bufferUpdated(nbytes)
+            self.twsConnection.hasData(None)
+
+else:
+    TWSBufferedSocket = None
+
 
 class TWS_Test(TWSClient):
     """
@@ -1,4 +1,6 @@
 import sys
+import math
+import time
 import struct
 import logging
 
@@ -10,6 +12,10 @@ import PyQt5.Qt as qt
 import PyQt5.QtNetwork as qtnetwork
 
 import tws_async.util as util
+from .framer import Framer
+from .fastdecoder import FastDecoder
+from .sendqueue import SendQueue
+from .metrics import Metrics
 
 util.allowCtrlC()
 
@@ -21,6 +27,13 @@ class TWSClientQt(EWrapper, EClient):
     Version of ibapi.client.EClient that integrates with the Qt event loop.
     """
     def __init__(self):
+        self._framer = Framer()
+        # decode hot market data messages with the FastDecoder
+        self.fastDecoder = False
+        # ceiling on the rate of messages sent to the server
+        self.maxMsgsPerSec = 45
+        # Metrics when enabled, else None
+        self.metrics = None
         EClient.__init__(self, wrapper=self)
         self.qApp = qt.QApplication.instance() or qt.QApplication(sys.argv)
         self.readyTrigger = Trigger()
@@ -28,7 +41,7 @@ class TWSClientQt(EWrapper, EClient):
 
     def reset(self):
         EClient.reset(self)
-        self._data = b''
+        self._framer.reset()
         self._reqIdSeq = 0
 
     def run(self):
@@ -40,7 +53,7 @@ class TWSClientQt(EWrapper, EClient):
         self.host = host
         self.port = port
         self.clientId = clientId
-        self.conn = TWSConnection(host, port)
+        self.conn = TWSConnection(host, port, self.maxMsgsPerSec)
         self.conn.connect()
         self.conn.socket.connected.connect(self._onSocketConnected)
         self.conn.socket.disconnected.connect(self._onSocketDisonnected)
@@ -59,6 +72,21 @@ class TWSClientQt(EWrapper, EClient):
         self._reqIdSeq += 1
         return newId
 
+    def enableMetrics(self, loopLagInterval=0.1) -> Metrics:
+        """
+        Start collecting metrics of the message handling and sample
+        the event loop lag every loopLagInterval seconds (0 to not
+        sample). The lag has the millisecond resolution of QTimer.
+        """
+        self.disableMetrics()
+        self.metrics = Metrics(self, _callLater, loopLagInterval)
+        return self.metrics
+
+    def disableMetrics(self):
+        if self.metrics:
+            self.metrics.stop()
+            self.metrics = None
+
     def dataHandlingPre(self):
         pass
 
@@ -76,9 +104,14 @@ class TWSClientQt(EWrapper, EClient):
                 ibapi.server_versions.MIN_CLIENT_VER,
                 ibapi.server_versions.MAX_CLIENT_VER))
         self.conn.sendMsg(msg)
-        self.decoder = ibapi.decoder.Decoder(self.wrapper, None)
+        decoderClass = FastDecoder if self.fastDecoder \
+                else ibapi.decoder.Decoder
+        self.decoder = decoderClass(self.wrapper, None)
 
     def _onSocketDisonnected(self):
+        if self.conn:
+            # the queued messages cannot be sent anymore
+            self.conn.sendQueue.clear()
         EClient.disconnect(self)
 
     def _onSocketError(self, socketError):
@@ -87,53 +120,60 @@ class TWSClientQt(EWrapper, EClient):
 
     def _onSocketReadyRead(self):
         self.dataHandlingPre()
-        self._data += bytes(self.conn.socket.readAll())
-
-        while True:
-            if len(self._data) <= 4:
-                break
-            # 4 byte prefix tells the message length
-            msgEnd = 4 + struct.unpack('>I', self._data[:4])[0]
-            if len(self._data) < msgEnd:
-                # insufficient data for now
-                break
-            msg = self._data[4:msgEnd]
-            self._data = self._data[msgEnd:]
-            fields = msg.split(b'\0')
-            fields.pop()  # pop off last empty element
-
-            if not self.serverVersion_ and len(fields) == 2:
-                # this concludes the handshake
-                version, self.connTime = fields
-                self.serverVersion_ = int(version)
-                self.decoder.serverVersion = self.serverVersion_
-                self.setConnState(EClient.CONNECTED)
-                self.startApi()
-                self.wrapper.connectAck()
-                self._logger.info('Logged on to server version {}'.
-                        format(self.serverVersion_))
-            else:
-                # snoop for next valid id response,
-                # it signals readiness of the client
-                if fields[0] == b'9':
-                    _, _, validId = fields
-                    self._reqIdSeq = int(validId)
-                    self.readyTrigger.go()
-
-                # decode and handle the message
-                self.decoder.interpret(fields)
+        self._framer.feed(bytes(self.conn.socket.readAll()))
+
+        metrics = self.metrics
+        if metrics is None:
+            for msg in self._framer.frames():
+                fields = msg.split(b'\0')
+                fields.pop()  # pop off last empty element
+                self._handleFields(fields)
+        else:
+            numBytes = len(self._framer)
+            msgs = self._framer.frames()
+            metrics.addRead(len(msgs), numBytes)
+            for msg in msgs:
+                t0 = time.perf_counter()
+                fields = msg.split(b'\0')
+                fields.pop()
+                self._handleFields(fields)
+                metrics.addMessage(fields[0], len(msg),
+                        time.perf_counter() - t0)
 
         self.dataHandlingPost()
 
+    def _handleFields(self, fields):
+        if not self.serverVersion_ and len(fields) == 2:
+            # this concludes the handshake
+            version, self.connTime = fields
+            self.serverVersion_ = int(version)
+            self.decoder.serverVersion = self.serverVersion_
+            self.setConnState(EClient.CONNECTED)
+            self.startApi()
+            self.wrapper.connectAck()
+            self._logger.info('Logged on to server version {}'.
+                    format(self.serverVersion_))
+        else:
+            # snoop for next valid id response,
+            # it signals readiness of the client
+            if fields[0] == b'9':
+                _, _, validId = fields
+                self._reqIdSeq = int(validId)
+                self.readyTrigger.go()
+
+            # decode and handle the message
+            self.decoder.interpret(fields)
+
 
 class TWSConnection:
     """
     Replacement for ibapi.connection.Connection that uses a QTcpSocket.
     """
-    def __init__(self, host, port):
+    def __init__(self, host, port, maxMsgsPerSec=45):
         self.host = host
         self.port = port
         self.socket = None
+        self.sendQueue = SendQueue(self._write, _callLater, maxMsgsPerSec)
 
     def connect(self):
         self.socket = qtnetwork.QTcpSocket()
@@ -143,6 +183,8 @@ class TWSConnection:
         self.socket.connectToHost(self.host, self.port)
 
     def disconnect(self):
+        # messages sent just before disconnecting still go out
+        self.sendQueue.writeAll()
         self.socket.close()
         self.socket = None
 
@@ -150,8 +192,16 @@ class TWSConnection:
         return self.socket is not None
 
     def sendMsg(self, msg):
-        self.socket.write(msg)
-        self.socket.flush()
+        self.sendQueue.put(msg)
+
+    def _write(self, data):
+        if self.socket:
+            self.socket.write(data)
+            self.socket.flush()
+
+
+def _callLater(delay, func):
+    qt.QTimer.singleShot(math.ceil(1000 * delay), func)
 
 
 class Trigger(qt.QObject):
@@ -1,8 +1,27 @@
+import sys
+import mmap
+import asyncio
+import array
 import datetime
 import logging
 import signal
 
-__all__ = ['dateRange', 'allowCtrlC', 'logToFile', 'logToConsole', 'LogFilter']
+__all__ = ['dateRange', 'allowCtrlC', 'logToFile', 'logToConsole', 'LogFilter',
+        'loadBars', 'durationSeconds', 'barSizeSeconds', 'maxDuration',
+        'useUvloop']
+
+_durationUnits = {'S': 1, 'D': 86400, 'W': 7 * 86400, 'M': 30 * 86400,
+        'Y': 365 * 86400}
+
+_barSizeUnits = {'sec': 1, 'secs': 1, 'min': 60, 'mins': 60,
+        'hour': 3600, 'hours': 3600, 'day': 86400, 'days': 86400,
+        'week': 7 * 86400, 'month': 30 * 86400}
+
+# longest duration that the server accepts from a bar size (in seconds)
+# and up, largest bar size first
+_maxDurations = [(86400, '1 Y'), (1800, '1 M'), (180, '1 W'), (120, '2 D'),
+        (60, '1 D'), (30, '28800 S'), (10, '14400 S'), (5, '3600 S'),
+        (1, '1800 S')]
 
 
 def dateRange(startDate, endDate, skipWeekend=True):
@@ -21,6 +40,36 @@ def dateRange(startDate, endDate, skipWeekend=True):
         date += day
 
 
+def durationSeconds(durationStr: str) -> int:
+    """
+    Convert a duration such as '30 D' to its number of seconds,
+    counting a month as 30 days and a year as 365 days.
+    """
+    num, unit = durationStr.split()
+    return int(num) * _durationUnits[unit.upper()]
+
+
+def barSizeSeconds(barSizeSetting: str) -> int:
+    """
+    Convert a bar size such as '5 mins' to its number of seconds,
+    counting a month as 30 days.
+    """
+    num, unit = barSizeSetting.split()
+    return int(num) * _barSizeUnits[unit]
+
+
+def maxDuration(barSizeSetting: str) -> str:
+    """
+    Get the longest duration string that the server accepts for
+    a historical request with the given bar size.
+    """
+    barSize = barSizeSeconds(barSizeSetting)
+    for minBarSize, durationStr in _maxDurations:
+        if barSize >= minBarSize:
+            return durationStr
+    return _maxDurations[-1][1]
+
+
 def allowCtrlC():
     """
     Allow Control-C to end program.
@@ -28,6 +77,20 @@ def allowCtrlC():
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 
+def useUvloop() -> bool:
+    """
+    Use the faster event loop of uvloop for asyncio, if it is installed.
+    Return True if it is used. This must be called before any
+    clients are created.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
 def logToFile(path, level=logging.INFO, ibapiLevel=logging.ERROR):
     """
     Create a log handler that logs to the given file.
@@ -67,3 +130,32 @@ class LogFilter(logging.Filter):
 
     def filter(self, record):
         return record.name != self.name or record.levelno >= self.level
+
+
+def loadBars(path, timezone=None):
+    """
+    Memory-map a binary bar file as written by BarStore.save and return
+    it as a read-only BarStore. The timezone is used for converting
+    bar times to datetimes when they are accessed.
+    """
+    from .barstore import BarStore, MAGIC, HEADER, FLAG_DATE_ONLY, np
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, n, flags = HEADER.unpack_from(mm)
+    if magic != MAGIC:
+        raise ValueError('{} is not a bar file'.format(path))
+    cols = []
+    offset = HEADER.size
+    for t in BarStore._typecodes:
+        if np is not None:
+            col = np.frombuffer(mm, dtype='<' + t, count=n, offset=offset)
+        elif sys.byteorder == 'little':
+            col = memoryview(mm)[offset:offset + 8 * n].cast(t)
+        else:
+            col = array.array(t, mm[offset:offset + 8 * n])
+            col.byteswap()
+        cols.append(col)
+        offset += 8 * n
+    bars = BarStore.fromColumns(cols, bool(flags & FLAG_DATE_ONLY))
+    bars.timezone = timezone
+    return bars